@@ -1,25 +1,118 @@
 #!/usr/bin/env python3
-from flask import Flask, request, session, jsonify, make_response, send_from_directory
+from datetime import datetime
+from flask import Flask, Response, request, session, jsonify, make_response, stream_with_context
 from flask_restful import Resource
 from config import app, db, api
-from models import User, Recipe, Comment, Like, Favorite, Notification
+from sqlalchemy.exc import IntegrityError
+from models import User, Recipe, Comment, Like, Favorite, Notification, duplicate_field
+from pagination import MAX_PAGE_SIZE, parse_limit, keyset_page, newer_than, encode_cursor, encode_offset, decode_offset
+from counters import bump_recipe_counters, bump_user_counters
+from conditional import conditional, recipe_validators, recipe_comments_validators, feed_validators, notification_validators
+from notifications import notify, touch_notifications, unread_count, mark_read, purge_read_notifications, publish_notification, notification_rows, stream_notifications
+from cache import (
+    cache, cached, invalidate_recipe, recipe_cache_keys,
+    RECIPE_KEY, RECIPE_COMMENTS_KEY, USER_RECIPES_KEY, USER_FAVORITES_KEY, USER_PROFILE_KEY
+)
+from serializers import (
+    Author, group_by_recipe, USER, USER_PROFILE, RECIPE, RECIPE_WITH_AUTHOR,
+    LIKE_SUMMARY, FAVORITE_SUMMARY, FAVORITE_WITH_RECIPE, COMMENT_SUMMARY, COMMENT_WITH_AUTHOR,
+    COMMENT_CREATED, NOTIFICATION, NOTIFICATION_WITH_ACTOR
+)
+from search import tokenize, get_index, index_recipe, unindex_recipe
+from ingredients import canonical_name, set_recipe_ingredients, INGREDIENT_MATCHERS
+from images import image_pipeline, pick_variant
+from storage import storage, send_upload, upload_url
+from passwords import HasherBusy, verify_unknown_user
+from throttle import login_throttle
+from usernames import usernames
+from reactions import like_recipe, unlike_recipe, favorite_recipe, unfavorite_recipe, interactions
+from idempotency import idempotent
+from writebehind import write_behind
+from replicas import read_replica
+from timeline import follow_user, unfollow_user, fan_out, remove_from_timelines, home_timeline
+from trending import PERIODS as TRENDING_PERIODS, engagement, record_engagement, trending_query
 from werkzeug.exceptions import NotFound, Unauthorized
 from werkzeug.utils import secure_filename
-import os
-import uuid
 
 @app.route('/')
 def index():
     return '<h1>Recipe App Backend</h1>'
 
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+@app.route('/uploads/<path:key>')
+def uploaded_file(key):
+    size = request.args.get('size', type=int)
+    if size and size > 0:
+        accept_webp = 'image/webp' in request.accept_mimetypes.values()
+        variant = pick_variant(key, size, accept_webp)
+        response = send_upload(variant) if variant else send_upload(key, max_age=60)
+        # Until the variants exist the original stands in, but only briefly.
+        response.vary.add('Accept')
+        return response
+    return send_upload(key)
+
+@app.route('/api/notifications/stream')
+def notification_stream():
+    user_id = session.get('user_id')
+    if not user_id:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    
+    return Response(
+        stream_with_context(stream_notifications(user_id, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify(cache.stats())
 
 def allowed_file(filename):
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+CHILD_PLANS = {
+    'likes': (Like, LIKE_SUMMARY),
+    'favorites': (Favorite, FAVORITE_SUMMARY),
+    'comments': (Comment, COMMENT_SUMMARY),
+}
+
+SEARCH_FILTERS = {
+    'min_time': lambda value: Recipe.cooking_time >= value,
+    'max_time': lambda value: Recipe.cooking_time <= value,
+    'user_id': lambda value: Recipe.user_id == value,
+}
+
+SEARCHABLE_FIELDS = {'title', 'description', 'ingredients'}
+
+EDITABLE_RECIPE_FIELDS = {'title', 'description', 'ingredients', 'instructions', 'cooking_time', 'image_url'}
+
+def comment_page(recipe_id, cursor=None, limit=None, since=None):
+    """Newest-first page of a recipe's comments, with their authors joined
+    in, and the cursor for the next page."""
+    query = COMMENT_WITH_AUTHOR.query().join(Author, Comment.user_id == Author.id).filter(Comment.recipe_id == recipe_id)
+    if since:
+        query = newer_than(query, Comment.created_at, Comment.id, since)
+    return keyset_page(query, Comment.created_at, Comment.id, cursor, parse_limit(limit))
+
+def requested_children():
+    # Per-recipe arrays are opt-in; clients get their own like and favorite
+    # state from MyInteractions instead.
+    return set(request.args.get('include', '').split(',')) & set(CHILD_PLANS)
+
+def attach_children(recipes, names):
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    for name in names:
+        model, plan = CHILD_PLANS[name]
+        grouped = group_by_recipe(plan, model, recipe_ids)
+        for recipe in recipes:
+            recipe[name] = grouped.get(recipe['id'], [])
+
 class Signup(Resource):
     def post(self):
         data = request.get_json()
@@ -29,42 +122,61 @@ class Signup(Resource):
                 username=data.get('username'),
                 email=data.get('email'),
             )
+            # Turn away taken names before spending a bcrypt round on them.
+            if usernames.taken(user.username):
+                return {'error': 'Username already taken'}, 400
+            db.session.close()
             user.password_hash = data.get('password')
             
             db.session.add(user)
             db.session.commit()
+            usernames.add(user.username)
             
             session['user_id'] = user.id
             
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_picture': user.profile_picture,
-                'created_at': user.created_at.isoformat() if user.created_at else None
-            }, 201
+            return USER.dump_object(user), 201
             
         except ValueError as e:
             return {'error': str(e)}, 400
+        except IntegrityError as e:
+            db.session.rollback()
+            if duplicate_field(e) == 'email':
+                return {'error': 'Email already registered'}, 400
+            return {'error': 'Username already taken'}, 400
+        except HasherBusy:
+            db.session.rollback()
+            return {'error': 'Server busy, please retry'}, 503, {'Retry-After': '1'}
 
 class Login(Resource):
     def post(self):
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
+        username, password = data.get('username') or '', data.get('password') or ''
+        if not isinstance(username, str) or not isinstance(password, str):
+            return {'error': 'Username and password must be strings'}, 400
+        
+        retry_after = login_throttle.retry_after(request.remote_addr, username)
+        if retry_after:
+            return {'error': 'Too many login attempts, try again later'}, 429, {'Retry-After': str(retry_after)}
         
-        user = User.query.filter(User.username == data.get('username')).first()
+        user = User.query.filter(User.username == username).first()
+        # Hand the connection back before waiting on bcrypt, so a login
+        # flood cannot drain the pool other requests need.
+        db.session.close()
         
-        if user and user.authenticate(data.get('password')):
+        try:
+            authenticated = user.authenticate(password) if user else verify_unknown_user(password)
+        except HasherBusy:
+            return {'error': 'Server busy, please retry'}, 503, {'Retry-After': '1'}
+        
+        if authenticated:
+            login_throttle.succeeded(username)
+            db.session.add(user)
+            if db.session.dirty:
+                db.session.commit()
             session['user_id'] = user.id
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_picture': user.profile_picture,
-                'created_at': user.created_at.isoformat() if user.created_at else None
-            }, 200
+            return USER.dump_object(user), 200
         
+        login_throttle.failed(username)
         return {'error': 'Invalid credentials'}, 401
 
 class Logout(Resource):
@@ -74,51 +186,38 @@ class Logout(Resource):
             return {}, 204
         return {'error': 'Not logged in'}, 401
 
+class UsernameAvailability(Resource):
+    def get(self):
+        username = request.args.get('username', '')
+        if len(username) < 3:
+            return {'error': 'Username must be at least 3 characters long'}, 400
+        return {'username': username, 'available': not usernames.taken(username)}, 200
+
 class CheckSession(Resource):
     def get(self):
         user_id = session.get('user_id')
         if user_id:
-            user = User.query.get(user_id)
-            recipe_count = Recipe.query.filter_by(user_id=user_id).count()
-            
-            likes_received = db.session.query(Like).join(Recipe).filter(Recipe.user_id == user_id).count()
-            
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_picture': user.profile_picture,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'recipe_count': recipe_count,
-                'likes_received': likes_received
-            }, 200
+            user = USER_PROFILE.query().filter(User.id == user_id).first()
+            if user:
+                return USER_PROFILE.dump(user), 200
         return {'error': 'Not logged in'}, 401
 
 class Recipes(Resource):
+    @read_replica
+    @conditional(feed_validators)
     def get(self):
-        recipes = Recipe.query.all()
-        result = []
-        for recipe in recipes:
-            result.append({
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
-                'user': {
-                    'id': recipe.user.id,
-                    'username': recipe.user.username,
-                    'profile_picture': recipe.user.profile_picture
-                },
-                'likes': [{'id': like.id, 'user_id': like.user_id} for like in recipe.likes],
-                'favorites': [{'id': fav.id, 'user_id': fav.user_id} for fav in recipe.favorites],
-                'comments': [{'id': comment.id, 'content': comment.content, 'user_id': comment.user_id} for comment in recipe.comments]
-            })
-        return result, 200
+        include = requested_children()
+        query = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id)
+
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            rows, next_cursor = keyset_page(query, Recipe.created_at, Recipe.id, request.args.get('cursor'), limit)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        result = RECIPE_WITH_AUTHOR.dump_many(rows)
+        attach_children(result, include)
+        return {'recipes': result, 'next_cursor': next_cursor}, 200
 
     def post(self):
         if not session.get('user_id'):
@@ -138,54 +237,126 @@ class Recipes(Resource):
             )
             
             db.session.add(recipe)
+            bump_user_counters(recipe.user_id, recipe_count=1)
+            db.session.flush()
+            index_recipe(recipe)
+            set_recipe_ingredients(recipe)
+            fan_out(recipe)
             db.session.commit()
+            cache.delete(USER_RECIPES_KEY.format(user_id=recipe.user_id), USER_PROFILE_KEY.format(user_id=recipe.user_id))
             
-            return {
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None
-            }, 201
+            return RECIPE.dump_object(recipe), 201
             
         except ValueError as e:
             return {'error': str(e)}, 400
 
+class RecipeSearch(Resource):
+    @read_replica
+    def get(self):
+        tokens = tokenize(request.args.get('q'))
+        if not tokens:
+            return {'error': 'Search query is required'}, 400
+        
+        query = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id)
+        for name, condition in SEARCH_FILTERS.items():
+            value = request.args.get(name)
+            if value in (None, ''):
+                continue
+            if not value.isdigit():
+                return {'error': f'{name} must be a non-negative integer'}, 400
+            query = query.filter(condition(int(value)))
+        if request.args.get('author'):
+            query = query.filter(Author.username == request.args.get('author'))
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            offset = decode_offset(request.args.get('cursor'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        rows = get_index().search(query, tokens, offset, limit)
+        next_cursor = encode_offset(offset + limit) if len(rows) > limit else None
+        return {'recipes': RECIPE_WITH_AUTHOR.dump_many(rows[:limit]), 'next_cursor': next_cursor}, 200
+
+class TrendingRecipes(Resource):
+    @read_replica
+    def get(self):
+        period = request.args.get('period', 'day')
+        if period not in TRENDING_PERIODS:
+            return {'error': f"period must be one of: {', '.join(TRENDING_PERIODS)}"}, 400
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            offset = decode_offset(request.args.get('cursor'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        query = trending_query(RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id), period)
+        rows = query.offset(offset).limit(limit + 1).all()
+        next_cursor = encode_offset(offset + limit) if len(rows) > limit else None
+        return {'recipes': RECIPE_WITH_AUTHOR.dump_many(rows[:limit]), 'next_cursor': next_cursor}, 200
+
+class HomeTimeline(Resource):
+    @read_replica
+    def get(self):
+        user_id = session.get('user_id')
+        if not user_id:
+            return {'error': 'Not logged in'}, 401
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            recipe_ids, next_cursor = home_timeline(user_id, request.args.get('cursor'), limit)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        rows = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id).filter(
+            Recipe.id.in_(recipe_ids)
+        ).all() if recipe_ids else []
+        recipes = {recipe['id']: recipe for recipe in RECIPE_WITH_AUTHOR.dump_many(rows)}
+        return {'recipes': [recipes[id] for id in recipe_ids if id in recipes], 'next_cursor': next_cursor}, 200
+
+class RecipesByIngredients(Resource):
+    @read_replica
+    def get(self):
+        names = {canonical_name(name) for name in request.args.get('ingredients', '').split(',')} - {None}
+        if not names:
+            return {'error': 'At least one ingredient is required'}, 400
+        
+        match = request.args.get('match', 'all')
+        if match not in INGREDIENT_MATCHERS:
+            return {'error': f'match must be one of: {sorted(INGREDIENT_MATCHERS)}'}, 400
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            offset = decode_offset(request.args.get('cursor'))
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        # Posting lists come back oldest first; serve newest first like the feed.
+        recipe_ids = INGREDIENT_MATCHERS[match](names)[::-1]
+        page = recipe_ids[offset:offset + limit]
+        rows = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id).filter(
+            Recipe.id.in_(page)
+        ).order_by(Recipe.id.desc()).all() if page else []
+        next_cursor = encode_offset(offset + limit) if len(recipe_ids) > offset + limit else None
+        return {'recipes': RECIPE_WITH_AUTHOR.dump_many(rows), 'next_cursor': next_cursor}, 200
+
 class RecipeByID(Resource):
+    @read_replica
+    @conditional(recipe_validators)
+    @cached(RECIPE_KEY)
     def get(self, id):
-        recipe = Recipe.query.get(id)
-        if recipe:
-            return {
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
-                'user': {
-                    'id': recipe.user.id,
-                    'username': recipe.user.username,
-                    'profile_picture': recipe.user.profile_picture
-                },
-                'likes': [{'id': like.id, 'user_id': like.user_id} for like in recipe.likes],
-                'favorites': [{'id': fav.id, 'user_id': fav.user_id} for fav in recipe.favorites],
-                'comments': [{
-                    'id': comment.id, 
-                    'content': comment.content, 
-                    'user_id': comment.user_id,
-                    'created_at': comment.created_at.isoformat() if comment.created_at else None,
-                    'user': {
-                        'id': comment.user.id,
-                        'username': comment.user.username,
-                        'profile_picture': comment.user.profile_picture
-                    }
-                } for comment in recipe.comments]
-            }, 200
+        row = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id).filter(Recipe.id == id).first()
+        if row:
+            recipe = RECIPE_WITH_AUTHOR.dump(row)
+            # likes and favorites grow with the recipe's popularity, so like
+            # the feeds they are opt-in.
+            attach_children([recipe], requested_children() - {'comments'})
+            # The rest of the thread is paged from RecipeComments; comments_count
+            # is the total.
+            rows, recipe['comments_next_cursor'] = comment_page(id)
+            recipe['comments'] = COMMENT_WITH_AUTHOR.dump_many(rows)
+            return recipe, 200
         return {'error': 'Recipe not found'}, 404
 
     def patch(self, id):
@@ -202,20 +373,21 @@ class RecipeByID(Resource):
         data = request.get_json()
         
         try:
-            for attr in data:
+            # Ids, owner, timestamps, counters and trending scores are kept
+            # by the server; anything else in the body is ignored.
+            for attr in EDITABLE_RECIPE_FIELDS & set(data):
                 setattr(recipe, attr, data[attr])
+            
+            if SEARCHABLE_FIELDS & set(data):
+                index_recipe(recipe)
+            if 'ingredients' in data:
+                set_recipe_ingredients(recipe)
+            if 'title' in data:
+                touch_notifications(recipe.id)
                 
             db.session.commit()
-            return {
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None
-            }, 200
+            invalidate_recipe(recipe.id, recipe.user_id)
+            return RECIPE.dump_object(recipe), 200
             
         except ValueError as e:
             return {'error': str(e)}, 400
@@ -231,33 +403,26 @@ class RecipeByID(Resource):
         if recipe.user_id != session.get('user_id'):
             return {'error': 'Not authorized'}, 403
             
+        stale_keys = recipe_cache_keys(recipe.id, recipe.user_id)
+        bump_user_counters(recipe.user_id, recipe_count=-1, likes_received=-recipe.likes_count)
+        unindex_recipe(recipe.id)
+        remove_from_timelines(recipe.id)
+        touch_notifications(recipe.id)
         db.session.delete(recipe)
         db.session.commit()
+        cache.delete(*stale_keys)
         
         return {}, 204
 
 class UserRecipes(Resource):
+    @read_replica
+    @cached(USER_RECIPES_KEY)
     def get(self, user_id):
-        recipes = Recipe.query.filter(Recipe.user_id == user_id).all()
-        result = []
-        for recipe in recipes:
-            result.append({
-                'id': recipe.id,
-                'title': recipe.title,
-                'description': recipe.description,
-                'ingredients': recipe.ingredients,
-                'instructions': recipe.instructions,
-                'cooking_time': recipe.cooking_time,
-                'image_url': recipe.image_url,
-                'created_at': recipe.created_at.isoformat() if recipe.created_at else None,
-                'user': {
-                    'id': recipe.user.id,
-                    'username': recipe.user.username,
-                    'profile_picture': recipe.user.profile_picture
-                },
-                'likes': [{'id': like.id, 'user_id': like.user_id} for like in recipe.likes],
-                'comments': [{'id': comment.id, 'content': comment.content, 'user_id': comment.user_id} for comment in recipe.comments]
-            })
+        rows = RECIPE_WITH_AUTHOR.query().join(Author, Recipe.user_id == Author.id).filter(
+            Recipe.user_id == user_id
+        ).order_by(Recipe.id)
+        result = RECIPE_WITH_AUTHOR.dump_many(rows)
+        attach_children(result, requested_children())
         return result, 200
 
 class Comments(Resource):
@@ -286,33 +451,26 @@ class Comments(Resource):
             )
             
             db.session.add(comment)
+            db.session.flush()
+            bump_recipe_counters(comment.recipe_id, comments_count=1)
+            record_engagement(comment.recipe_id, [engagement('comment', comment.created_at)])
             db.session.commit()
             
-            user = User.query.get(user_id)
-            
             recipe = Recipe.query.get(recipe_id)
             if recipe and recipe.user_id != user_id:
-                notification = Notification(
+                notification = notify(
                     type='comment',
                     user_id=recipe.user_id,
                     actor_id=user_id,
                     recipe_id=recipe.id
                 )
-                db.session.add(notification)
                 db.session.commit()
+                publish_notification(notification)
+            
+            if recipe:
+                invalidate_recipe(recipe.id, recipe.user_id)
             
-            return {
-                'id': comment.id,
-                'content': comment.content,
-                'user_id': comment.user_id,
-                'recipe_id': comment.recipe_id,
-                'created_at': comment.created_at.isoformat(),
-                'user': {
-                    'id': user.id,
-                    'username': user.username,
-                    'profile_picture': user.profile_picture
-                }
-            }, 201
+            return COMMENT_CREATED.dump_object(comment), 201
             
         except Exception as e:
             db.session.rollback()
@@ -338,15 +496,40 @@ class Comments(Resource):
             if comment.user_id != user_id and (not recipe or recipe.user_id != user_id):
                 return {'error': 'Not authorized to delete this comment'}, 403
             
+            recipe_id = comment.recipe_id
+            record_engagement(recipe_id, [engagement('comment', comment.created_at, removed=True)])
             db.session.delete(comment)
+            bump_recipe_counters(recipe_id, comments_count=-1)
             db.session.commit()
+            invalidate_recipe(recipe_id, recipe.user_id if recipe else None)
             return {}, 204
             
         except Exception as e:
             db.session.rollback()
             return {'error': 'Failed to delete comment'}, 500
 
+def reaction_response(recipe_id, counts, changed, created_status=200, **state):
+    """Commit a like/favorite change and describe the recipe's new state."""
+    if counts is None:
+        db.session.rollback()
+        return {'error': 'Recipe not found'}, 404
+    db.session.commit()
+    return dict(state, **{
+        'recipe_id': recipe_id,
+        'likes_count': counts.likes_count,
+        'favorites_count': counts.favorites_count
+    }), created_status if changed else 200
+
+def buffer_like(user_id, recipe_id, liked):
+    """Hand a like or unlike to the write-behind buffer and acknowledge it
+    before it reaches the database."""
+    if not isinstance(recipe_id, int) or isinstance(recipe_id, bool):
+        return {'error': 'recipe_id must be an integer'}, 400
+    write_behind.enqueue(user_id, recipe_id, liked)
+    return {'recipe_id': recipe_id, 'liked': liked, 'favorited': liked, 'pending': True}, 202
+
 class Likes(Resource):
+    @idempotent
     def post(self):
         if not session.get('user_id'):
             return {'error': 'Not logged in'}, 401
@@ -356,61 +539,36 @@ class Likes(Resource):
         if not data or not data.get('recipe_id'):
             return {'error': 'recipe_id is required'}, 400
         
+        user_id, recipe_id = session.get('user_id'), data.get('recipe_id')
+        if write_behind:
+            return buffer_like(user_id, recipe_id, True)
         try:
-            existing_like = Like.query.filter_by(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            ).first()
-            
-            if existing_like:
-                return {'error': 'Recipe already liked'}, 400
-                
-            like = Like(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            )
-            
-            db.session.add(like)
-            db.session.flush()
-            
-            existing_fav = Favorite.query.filter_by(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            ).first()
+            changed, counts = like_recipe(user_id, recipe_id)
             
-            if not existing_fav:
-                favorite = Favorite(
-                    user_id=session.get('user_id'),
-                    recipe_id=data.get('recipe_id')
-                )
-                db.session.add(favorite)
-            
-            recipe = Recipe.query.get(data.get('recipe_id'))
-            if recipe and recipe.user_id != session.get('user_id'):
-                notification = Notification(
+            notification = None
+            if changed and counts and counts.user_id != user_id:
+                notification = notify(
                     type='like',
-                    user_id=recipe.user_id,
-                    actor_id=session.get('user_id'),
-                    recipe_id=recipe.id
+                    user_id=counts.user_id,
+                    actor_id=user_id,
+                    recipe_id=recipe_id
                 )
-                db.session.add(notification)
             
-            db.session.commit()
-            
-            return {
-                'id': like.id,
-                'user_id': like.user_id,
-                'recipe_id': like.recipe_id,
-                'created_at': like.created_at.isoformat() if like.created_at else None
-            }, 201
+            response = reaction_response(recipe_id, counts, changed, 201, liked=True, favorited=True)
+            if notification:
+                publish_notification(notification)
+            if changed and counts:
+                invalidate_recipe(recipe_id, counts.user_id, user_id)
+            return response
             
-        except ValueError as e:
+        except IntegrityError:
             db.session.rollback()
-            return {'error': str(e)}, 400
+            return {'error': 'Recipe not found'}, 404
         except Exception as e:
             db.session.rollback()
             return {'error': 'Failed to create like'}, 500
 
+    @idempotent
     def delete(self):
         if not session.get('user_id'):
             return {'error': 'Not logged in'}, 401
@@ -420,32 +578,21 @@ class Likes(Resource):
         if not data or not data.get('recipe_id'):
             return {'error': 'recipe_id is required'}, 400
         
+        user_id, recipe_id = session.get('user_id'), data.get('recipe_id')
+        if write_behind:
+            return buffer_like(user_id, recipe_id, False)
         try:
-            like = Like.query.filter_by(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            ).first()
-            
-            if like:
-                db.session.delete(like)
-                
-                favorite = Favorite.query.filter_by(
-                    user_id=session.get('user_id'),
-                    recipe_id=data.get('recipe_id')
-                ).first()
-                
-                if favorite:
-                    db.session.delete(favorite)
-                
-                db.session.commit()
-                return {}, 204
-                
-            return {'error': 'Like not found'}, 404
+            changed, counts = unlike_recipe(user_id, recipe_id)
+            response = reaction_response(recipe_id, counts, changed, liked=False, favorited=False)
+            if changed and counts:
+                invalidate_recipe(recipe_id, counts.user_id, user_id)
+            return response
         except Exception as e:
             db.session.rollback()
             return {'error': 'Failed to remove like'}, 500
 
 class Favorites(Resource):
+    @idempotent
     def post(self):
         if not session.get('user_id'):
             return {'error': 'Not logged in'}, 401
@@ -455,37 +602,22 @@ class Favorites(Resource):
         if not data or not data.get('recipe_id'):
             return {'error': 'recipe_id is required'}, 400
         
+        user_id, recipe_id = session.get('user_id'), data.get('recipe_id')
         try:
-            existing_fav = Favorite.query.filter_by(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            ).first()
-            
-            if existing_fav:
-                return {'error': 'Recipe already favorited'}, 400
-                
-            favorite = Favorite(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            )
-            
-            db.session.add(favorite)
-            db.session.commit()
+            changed, counts = favorite_recipe(user_id, recipe_id)
+            response = reaction_response(recipe_id, counts, changed, 201, favorited=True)
+            if changed and counts:
+                invalidate_recipe(recipe_id, counts.user_id, user_id)
+            return response
             
-            return {
-                'id': favorite.id,
-                'user_id': favorite.user_id,
-                'recipe_id': favorite.recipe_id,
-                'created_at': favorite.created_at.isoformat() if favorite.created_at else None
-            }, 201
-            
-        except ValueError as e:
+        except IntegrityError:
             db.session.rollback()
-            return {'error': str(e)}, 400
+            return {'error': 'Recipe not found'}, 404
         except Exception as e:
             db.session.rollback()
             return {'error': 'Failed to create favorite'}, 500
 
+    @idempotent
     def delete(self):
         if not session.get('user_id'):
             return {'error': 'Not logged in'}, 401
@@ -495,85 +627,143 @@ class Favorites(Resource):
         if not data or not data.get('recipe_id'):
             return {'error': 'recipe_id is required'}, 400
         
+        user_id, recipe_id = session.get('user_id'), data.get('recipe_id')
         try:
-            favorite = Favorite.query.filter_by(
-                user_id=session.get('user_id'),
-                recipe_id=data.get('recipe_id')
-            ).first()
-            
-            if favorite:
-                db.session.delete(favorite)
-                
-                like = Like.query.filter_by(
-                    user_id=session.get('user_id'),
-                    recipe_id=data.get('recipe_id')
-                ).first()
-                
-                if like:
-                    db.session.delete(like)
-                
-                db.session.commit()
-                return {}, 204
-                
-            return {'error': 'Favorite not found'}, 404
+            changed, counts = unfavorite_recipe(user_id, recipe_id)
+            response = reaction_response(recipe_id, counts, changed, liked=False, favorited=False)
+            if changed and counts:
+                invalidate_recipe(recipe_id, counts.user_id, user_id)
+            return response
         except Exception as e:
             db.session.rollback()
             return {'error': 'Failed to remove favorite'}, 500
 
+def follow_target(user_id):
+    data = request.get_json(silent=True) or {}
+    followed_id = data.get('user_id')
+    if followed_id is None:
+        return None, ({'error': 'user_id is required'}, 400)
+    if not isinstance(followed_id, int) or isinstance(followed_id, bool):
+        return None, ({'error': 'user_id must be an integer'}, 400)
+    if followed_id == user_id:
+        return None, ({'error': 'You cannot follow yourself'}, 400)
+    return followed_id, None
+
+class Follows(Resource):
+    @idempotent
+    def post(self):
+        user_id = session.get('user_id')
+        if not user_id:
+            return {'error': 'Not logged in'}, 401
+        
+        followed_id, error = follow_target(user_id)
+        if error:
+            return error
+        
+        changed, follower_count = follow_user(user_id, followed_id)
+        if follower_count is None:
+            db.session.rollback()
+            return {'error': 'User not found'}, 404
+        
+        notification = None
+        if changed:
+            notification = notify(type='follow', user_id=followed_id, actor_id=user_id)
+        db.session.commit()
+        if notification:
+            publish_notification(notification)
+            cache.delete(USER_PROFILE_KEY.format(user_id=followed_id), USER_PROFILE_KEY.format(user_id=user_id))
+        return {'user_id': followed_id, 'following': True, 'follower_count': follower_count}, 201 if changed else 200
+
+    @idempotent
+    def delete(self):
+        user_id = session.get('user_id')
+        if not user_id:
+            return {'error': 'Not logged in'}, 401
+        
+        followed_id, error = follow_target(user_id)
+        if error:
+            return error
+        
+        changed, follower_count = unfollow_user(user_id, followed_id)
+        if follower_count is None:
+            db.session.rollback()
+            return {'error': 'User not found'}, 404
+        
+        db.session.commit()
+        if changed:
+            cache.delete(USER_PROFILE_KEY.format(user_id=followed_id), USER_PROFILE_KEY.format(user_id=user_id))
+        return {'user_id': followed_id, 'following': False, 'follower_count': follower_count}, 200
+
 class UserFavorites(Resource):
+    @read_replica
+    @cached(USER_FAVORITES_KEY)
     def get(self, user_id):
-        favorites = Favorite.query.filter(Favorite.user_id == user_id).all()
-        result = []
-        for fav in favorites:
-            result.append({
-                'id': fav.id,
-                'user_id': fav.user_id,
-                'recipe_id': fav.recipe_id,
-                'created_at': fav.created_at.isoformat() if fav.created_at else None,
-                'recipe': {
-                    'id': fav.recipe.id,
-                    'title': fav.recipe.title,
-                    'description': fav.recipe.description,
-                    'image_url': fav.recipe.image_url,
-                    'cooking_time': fav.recipe.cooking_time,
-                    'user': {
-                        'id': fav.recipe.user.id,
-                        'username': fav.recipe.user.username,
-                        'profile_picture': fav.recipe.user.profile_picture
-                    },
-                    'likes': [{'id': like.id, 'user_id': like.user_id} for like in fav.recipe.likes],
-                    'comments': [{'id': comment.id, 'content': comment.content, 'user_id': comment.user_id} for comment in fav.recipe.comments]
-                }
-            })
+        rows = FAVORITE_WITH_RECIPE.query().join(Recipe, Favorite.recipe_id == Recipe.id).join(
+            Author, Recipe.user_id == Author.id
+        ).filter(Favorite.user_id == user_id).order_by(Favorite.id)
+        result = FAVORITE_WITH_RECIPE.dump_many(rows)
+        attach_children([fav['recipe'] for fav in result], requested_children())
         return result, 200
 
+class MyInteractions(Resource):
+    @read_replica
+    def get(self):
+        user_id = session.get('user_id')
+        if not user_id:
+            return {'error': 'Not logged in'}, 401
+        
+        try:
+            recipe_ids = {int(id) for id in request.args.get('recipe_ids', '').split(',') if id.strip()}
+        except ValueError:
+            return {'error': 'recipe_ids must be comma separated integers'}, 400
+        if not recipe_ids:
+            return {'error': 'recipe_ids is required'}, 400
+        if len(recipe_ids) > MAX_PAGE_SIZE:
+            return {'error': f'At most {MAX_PAGE_SIZE} recipe_ids per request'}, 400
+        
+        return interactions(user_id, recipe_ids), 200
+
 class Notifications(Resource):
+    @conditional(notification_validators)
     def get(self, user_id):
         if not session.get('user_id') or session.get('user_id') != int(user_id):
             return {'error': 'Not authorized'}, 403
             
-        notifications = Notification.query.filter(
-            Notification.user_id == user_id
-        ).order_by(Notification.created_at.desc()).all()
-        
-        result = []
-        for notification in notifications:
-            result.append({
-                'id': notification.id,
-                'type': notification.type,
-                'read_status': notification.read_status,
-                'created_at': notification.created_at.isoformat() if notification.created_at else None,
-                'actor': {
-                    'id': notification.actor.id,
-                    'username': notification.actor.username,
-                    'profile_picture': notification.actor.profile_picture
-                },
-                'recipe': {
-                    'id': notification.recipe.id,
-                    'title': notification.recipe.title
-                } if notification.recipe else None
-            })
-        return result, 200
+        query = notification_rows().filter(Notification.user_id == user_id)
+        
+        try:
+            limit = parse_limit(request.args.get('limit'))
+            rows, next_cursor = keyset_page(query, Notification.created_at, Notification.id, request.args.get('cursor'), limit)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        return {
+            'notifications': NOTIFICATION_WITH_ACTOR.dump_many(rows),
+            'next_cursor': next_cursor,
+            'unread_count': unread_count(user_id)
+        }, 200
+
+class UnreadNotificationCount(Resource):
+    def get(self, user_id):
+        if not session.get('user_id') or session.get('user_id') != int(user_id):
+            return {'error': 'Not authorized'}, 403
+        return {'unread_count': unread_count(user_id)}, 200
+
+class MarkAllNotificationsRead(Resource):
+    def patch(self, user_id):
+        if not session.get('user_id') or session.get('user_id') != int(user_id):
+            return {'error': 'Not authorized'}, 403
+        
+        data = request.get_json(silent=True) or {}
+        up_to_id = data.get('up_to_id')
+        if up_to_id is not None and (not isinstance(up_to_id, int) or isinstance(up_to_id, bool)):
+            return {'error': 'up_to_id must be an integer'}, 400
+        
+        updated = mark_read(user_id, up_to_id)
+        purge_read_notifications(user_id)
+        db.session.commit()
+        
+        return {'updated': updated, 'unread_count': unread_count(user_id)}, 200
 
 class MarkNotificationRead(Resource):
     def patch(self, id):
@@ -587,50 +777,40 @@ class MarkNotificationRead(Resource):
         if notification.user_id != session.get('user_id'):
             return {'error': 'Not authorized'}, 403
             
-        notification.read_status = True
+        mark_read(notification.user_id, notification_id=notification.id)
         db.session.commit()
         
-        return {
-            'id': notification.id,
-            'type': notification.type,
-            'read_status': notification.read_status,
-            'created_at': notification.created_at.isoformat() if notification.created_at else None
-        }, 200
+        return NOTIFICATION.dump_object(notification), 200
 
 class RecipeComments(Resource):
+    @read_replica
+    @conditional(recipe_comments_validators)
+    @cached(RECIPE_COMMENTS_KEY)
     def get(self, recipe_id):
-        comments = Comment.query.filter(Comment.recipe_id == recipe_id).order_by(Comment.created_at.desc()).all()
-        result = []
-        for comment in comments:
-            result.append({
-                'id': comment.id,
-                'content': comment.content,
-                'created_at': comment.created_at.isoformat() if comment.created_at else None,
-                'user': {
-                    'id': comment.user.id,
-                    'username': comment.user.username,
-                    'profile_picture': comment.user.profile_picture
-                }
-            })
-        return result, 200
+        cursor, since = request.args.get('cursor'), request.args.get('since')
+        try:
+            rows, next_cursor = comment_page(recipe_id, cursor, request.args.get('limit'), since)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        
+        # Where a later refresh should pick up: ?since=latest_cursor returns
+        # only the comments added after this page's newest.
+        latest_cursor = since
+        if rows and not cursor:
+            latest_cursor = encode_cursor(rows[0].created_at, rows[0].id)
+        return {
+            'comments': COMMENT_WITH_AUTHOR.dump_many(rows),
+            'next_cursor': next_cursor,
+            'latest_cursor': latest_cursor
+        }, 200
 
 class UserProfile(Resource):
+    @read_replica
+    @cached(USER_PROFILE_KEY)
     def get(self, user_id):
-        user = User.query.get(user_id)
+        user = USER_PROFILE.query().filter(User.id == user_id).first()
         if user:
-            recipe_count = Recipe.query.filter_by(user_id=user_id).count()
-            likes_received = db.session.query(Like).join(Recipe).filter(Recipe.user_id == user_id).count()
-            
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_picture': user.profile_picture,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'recipe_count': recipe_count,
-                'likes_received': likes_received
-            }, 200
+            return USER_PROFILE.dump(user), 200
         return {'error': 'User not found'}, 404
 
     def patch(self, user_id):
@@ -641,14 +821,14 @@ class UserProfile(Resource):
         if not user:
             return {'error': 'User not found'}, 404
         
+        public_identity = (user.username, user.profile_picture)
+        uploaded = None
         try:
             if request.files and 'profile_picture' in request.files:
                 file = request.files['profile_picture']
                 if file and file.filename != '' and allowed_file(file.filename):
-                    filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-                    filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                    file.save(filepath)
-                    user.profile_picture = f'https://grab-a-grub-backend.onrender.com/uploads/{filename}'
+                    uploaded, _ = storage.save(file.stream, file.filename.rsplit('.', 1)[1].lower())
+                    user.profile_picture = upload_url(uploaded)
             
             if request.form:
                 username = request.form.get('username')
@@ -656,15 +836,9 @@ class UserProfile(Resource):
                 bio = request.form.get('bio')
                 
                 if username and username != user.username:
-                    existing_user = User.query.filter(User.username == username, User.id != user_id).first()
-                    if existing_user:
-                        return {'error': 'Username already taken'}, 400
                     user.username = username
                     
                 if email and email != user.email:
-                    existing_user = User.query.filter(User.email == email, User.id != user_id).first()
-                    if existing_user:
-                        return {'error': 'Email already taken'}, 400
                     user.email = email
                     
                 if bio is not None:
@@ -674,37 +848,38 @@ class UserProfile(Resource):
                 data = request.get_json()
                 if data:
                     if 'username' in data and data['username'] != user.username:
-                        existing_user = User.query.filter(User.username == data['username'], User.id != user_id).first()
-                        if existing_user:
-                            return {'error': 'Username already taken'}, 400
                         user.username = data['username']
                         
                     if 'email' in data and data['email'] != user.email:
-                        existing_user = User.query.filter(User.email == data['email'], User.id != user_id).first()
-                        if existing_user:
-                            return {'error': 'Email already taken'}, 400
                         user.email = data['email']
                         
                     if 'bio' in data:
                         user.bio = data['bio']
                     if 'profile_picture' in data:
                         user.profile_picture = data['profile_picture']
-                    
-            db.session.commit()
-            recipe_count = Recipe.query.filter_by(user_id=user_id).count()
-            likes_received = db.session.query(Like).join(Recipe).filter(Recipe.user_id == user_id).count()
-            
-            return {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'bio': user.bio,
-                'profile_picture': user.profile_picture,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
-                'recipe_count': recipe_count,
-                'likes_received': likes_received
-            }, 200
             
+            # Only the username and picture are embedded in other views, so
+            # only they move the identity version in every ETag.
+            if (user.username, user.profile_picture) != public_identity:
+                user.updated_at = datetime.utcnow()
+            db.session.commit()
+            if uploaded:
+                image_pipeline.submit(uploaded)
+            if user.username != public_identity[0]:
+                usernames.add(user.username)
+            if (user.username, user.profile_picture) != public_identity:
+                # Authors are embedded in recipe and comment views all over the cache.
+                cache.clear()
+            else:
+                cache.delete(USER_PROFILE_KEY.format(user_id=user.id))
+            
+            return USER_PROFILE.dump_object(user), 200
+            
+        except IntegrityError as e:
+            db.session.rollback()
+            if duplicate_field(e) == 'email':
+                return {'error': 'Email already taken'}, 400
+            return {'error': 'Username already taken'}, 400
         except Exception as e:
             return {'error': str(e)}, 400
 
@@ -712,15 +887,24 @@ api.add_resource(Signup, '/api/signup')
 api.add_resource(Login, '/api/login')
 api.add_resource(Logout, '/api/logout')
 api.add_resource(CheckSession, '/api/check_session')
+api.add_resource(UsernameAvailability, '/api/check_username')
 api.add_resource(Recipes, '/api/recipes')
+api.add_resource(RecipeSearch, '/api/recipes/search')
+api.add_resource(RecipesByIngredients, '/api/recipes/by_ingredients')
+api.add_resource(TrendingRecipes, '/api/recipes/trending')
+api.add_resource(HomeTimeline, '/api/timeline')
 api.add_resource(RecipeByID, '/api/recipes/<int:id>')
 api.add_resource(UserRecipes, '/api/recipes/user/<int:user_id>')
 api.add_resource(Comments, '/api/comments')
 api.add_resource(RecipeComments, '/api/comments/recipe/<int:recipe_id>')
 api.add_resource(Likes, '/api/likes')
 api.add_resource(Favorites, '/api/favorites')
+api.add_resource(Follows, '/api/follows')
 api.add_resource(UserFavorites, '/api/favorites/user/<int:user_id>')
+api.add_resource(MyInteractions, '/api/me/interactions')
 api.add_resource(Notifications, '/api/notifications/user/<int:user_id>')
+api.add_resource(UnreadNotificationCount, '/api/notifications/user/<int:user_id>/unread_count')
+api.add_resource(MarkAllNotificationsRead, '/api/notifications/user/<int:user_id>/mark_read')
 api.add_resource(MarkNotificationRead, '/api/notifications/<int:id>/mark_read')
 api.add_resource(UserProfile, '/api/users/<int:user_id>')
 
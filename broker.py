@@ -0,0 +1,95 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from config import app
+
+
+class LocalBackend:
+    """Delivers messages inside this process only. Fine for a single worker
+    and for tests; use a shared backend when running several workers."""
+
+    def __init__(self):
+        self._callback = None
+
+    def start(self, callback):
+        self._callback = callback
+
+    def publish(self, user_id, message):
+        if self._callback is not None:
+            self._callback(user_id, message)
+
+
+class RedisBackend:
+    """Relays messages through Redis pub/sub so every worker's subscribers
+    see events published by any worker."""
+
+    channel_prefix = 'grab-a-grub:notifications:'
+
+    def __init__(self, client):
+        self.client = client
+
+    def start(self, callback):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe(**{self.channel_prefix + '*': lambda message: callback(
+            int(message['channel'].decode('utf-8').rsplit(':', 1)[1]),
+            json.loads(message['data'])
+        )})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, user_id, message):
+        self.client.publish(self.channel_prefix + str(user_id), json.dumps(message))
+
+
+class Broker:
+    def __init__(self, backend, max_queued=100):
+        self.backend = backend
+        self.max_queued = max_queued
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        backend.start(self._deliver)
+
+    def publish(self, user_id, message):
+        self.backend.publish(user_id, message)
+
+    @contextmanager
+    def subscribe(self, user_id):
+        inbox = queue.Queue(maxsize=self.max_queued)
+        with self._lock:
+            self._subscribers[user_id].add(inbox)
+        try:
+            yield inbox
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(inbox)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def _deliver(self, user_id, message):
+        with self._lock:
+            inboxes = list(self._subscribers.get(user_id, ()))
+        for inbox in inboxes:
+            try:
+                inbox.put_nowait(message)
+            except queue.Full:
+                # A stalled client loses live events; it catches up through
+                # Last-Event-ID when it reconnects.
+                pass
+
+
+def create_broker(config):
+    backend = config.get('SSE_BROKER_BACKEND', 'local')
+    if backend == 'local':
+        return Broker(LocalBackend())
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SSE_BROKER_BACKEND=redis requires the 'redis' package")
+        return Broker(RedisBackend(redis.Redis.from_url(config['SSE_REDIS_URL'])))
+    raise ValueError(f"Unknown SSE_BROKER_BACKEND: {backend}")
+
+
+broker = create_broker(app.config)
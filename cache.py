@@ -0,0 +1,224 @@
+import fnmatch
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, request
+
+from config import app, db
+from models import Favorite
+
+RECIPE_KEY = 'recipe:{id}'
+RECIPE_COMMENTS_KEY = 'recipe_comments:{recipe_id}'
+USER_RECIPES_KEY = 'user_recipes:{user_id}'
+USER_FAVORITES_KEY = 'user_favorites:{user_id}'
+USER_PROFILE_KEY = 'user_profile:{user_id}'
+
+_MISSING = object()
+
+
+class LRUCache:
+    """In-process cache bounded by entry count, with a per-entry TTL."""
+
+    backend = 'memory'
+
+    def __init__(self, max_entries=2048, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self),
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+class StoreCache(LRUCache):
+    """Cache kept in a shared key/value store so every worker sees the same
+    entries and invalidations.
+
+    ``client`` needs the small subset of the redis-py API used here: ``get``,
+    ``setex``, ``delete`` and ``scan_iter``. Size bounds and evictions are the
+    store's business (e.g. Redis ``maxmemory-policy allkeys-lru``).
+    """
+
+    backend = 'store'
+
+    def __init__(self, client, ttl=30, prefix='grab-a-grub:'):
+        super().__init__(ttl=ttl)
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key, default=None):
+        raw = self.client.get(self.prefix + key)
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+        return pickle.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.setex(self.prefix + key, self.ttl if ttl is None else ttl, pickle.dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self.client.scan_iter(match=self.prefix + '*'))
+
+
+class LocalStore:
+    """Dict-backed stand-in for a Redis client, for development and tests."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def setex(self, key, ttl, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                value, expires_at = 0, None
+            self._data[key] = (int(value) + 1, expires_at)
+            return int(value) + 1
+
+    def expire(self, key, ttl):
+        with self._lock:
+            if key in self._data:
+                self._data[key] = (self._data[key][0], time.monotonic() + ttl)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def scan_iter(self, match='*'):
+        with self._lock:
+            keys = list(self._data)
+        return (key for key in keys if fnmatch.fnmatchcase(key, match))
+
+
+def create_cache(config):
+    backend = config.get('CACHE_BACKEND', 'memory')
+    ttl = config.get('CACHE_TTL', 30)
+
+    if backend == 'memory':
+        return LRUCache(max_entries=config.get('CACHE_MAX_ENTRIES', 2048), ttl=ttl)
+    if backend == 'local':
+        return StoreCache(LocalStore(), ttl=ttl)
+    if backend == 'redis':
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requires the 'redis' package")
+        return StoreCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), ttl=ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+cache = create_cache(app.config)
+
+
+def cached(key_template):
+    """Cache a resource's successful responses under ``key_template``,
+    formatted with the view's URL arguments. Requests with a query string
+    (e.g. later pages) are not cached: invalidation only knows the base key."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, **kwargs):
+            if request.args:
+                return func(self, **kwargs)
+            key = key_template.format(**kwargs)
+            response = cache.get(key)
+            if response is None:
+                # A replica can lag behind the write that just invalidated
+                # this key, so a miss is filled from the primary; hits and
+                # uncached requests still spread over the replicas.
+                g.db_replica = None
+                response = func(self, **kwargs)
+                if response[1] == 200:
+                    cache.set(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def recipe_cache_keys(recipe_id, owner_id=None, actor_id=None):
+    """Keys of every cached view that embeds the given recipe or its
+    likes, favorites and comments."""
+    keys = {RECIPE_KEY.format(id=recipe_id), RECIPE_COMMENTS_KEY.format(recipe_id=recipe_id)}
+    if owner_id is not None:
+        keys.add(USER_RECIPES_KEY.format(user_id=owner_id))
+        keys.add(USER_PROFILE_KEY.format(user_id=owner_id))
+    if actor_id is not None:
+        keys.add(USER_FAVORITES_KEY.format(user_id=actor_id))
+    favorited_by = db.session.query(Favorite.user_id).filter(Favorite.recipe_id == recipe_id)
+    keys.update(USER_FAVORITES_KEY.format(user_id=user_id) for (user_id,) in favorited_by)
+    return keys
+
+
+def invalidate_recipe(recipe_id, owner_id=None, actor_id=None):
+    cache.delete(*recipe_cache_keys(recipe_id, owner_id, actor_id))
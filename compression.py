@@ -0,0 +1,173 @@
+import time
+import zlib
+
+import click
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'text/event-stream', 'application/javascript')
+
+
+class _Gzip:
+    def __init__(self, level):
+        # wbits=31 writes the gzip header and trailer.
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        # A sync flush ends on a byte boundary the client can decode up to,
+        # so every streamed chunk is delivered without waiting for the next.
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def _stream(chunks, encoder):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = encoder.compress(chunk) + encoder.flush()
+            if data:
+                yield data
+        yield encoder.finish()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class Compression:
+    """Compresses responses with brotli or gzip, as the client's
+    ``Accept-Encoding`` prefers.
+
+    Only text types are compressed; uploads are sent as they are. Bodies
+    under ``COMPRESS_MIN_SIZE`` bytes gain less than the header costs and
+    stay uncompressed. Streamed responses (the notification stream) are
+    compressed chunk by chunk. A compressed response's ETag is made weak,
+    since the bytes differ from the uncompressed ones; ``conditional``
+    compares weakly, so either form still matches.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        _register_commands(app)
+        self.enabled = app.config['COMPRESS']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        self.encodings = (['br'] if brotli is not None else []) + ['gzip']
+        if self.enabled:
+            app.after_request(self.compress)
+
+    def _encoder(self, encoding):
+        return _Brotli(self.brotli_quality) if encoding == 'br' else _Gzip(self.level)
+
+    def compress(self, response):
+        if response.status_code == 304:
+            # Carry the ETag of the representation the client holds.
+            if self._negotiate():
+                _weaken_etag(response)
+            return response
+        if (
+            response.mimetype not in COMPRESSIBLE_TYPES or response.direct_passthrough
+            or response.status_code < 200 or response.status_code in (204, 206)
+            or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')
+        ):
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self._negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _stream(response.response, self._encoder(encoding))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            encoder = self._encoder(encoding)
+            response.set_data(encoder.compress(data) + encoder.finish())
+        response.headers['Content-Encoding'] = encoding
+        _weaken_etag(response)
+        return response
+
+    def _negotiate(self):
+        if request.method == 'HEAD':
+            return None
+        return request.accept_encodings.best_match(self.encodings)
+
+
+def _weaken_etag(response):
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def _register_commands(app):
+    @app.cli.command('benchmark-compression')
+    @click.option('--requests', 'count', default=50, help='Requests per endpoint and encoding.')
+    def benchmark_compression_command(count):
+        """Bytes on the wire and CPU per request for the feed endpoints,
+        uncompressed and with each available encoding."""
+        recipe_id = _busiest_recipe()
+        endpoints = [
+            '/api/recipes?limit=100',
+            '/api/recipes?limit=100&include=likes,favorites,comments',
+            '/api/recipes/trending?limit=100',
+        ]
+        if recipe_id is not None:
+            endpoints.append(f'/api/comments/recipe/{recipe_id}?limit=100')
+        encodings = ['identity'] + (['br'] if brotli is not None else []) + ['gzip']
+
+        # .flaskenv turns on debug for the CLI, which indents JSON; measure
+        # what production sends.
+        app.debug = False
+        client = app.test_client()
+        for url in endpoints:
+            print(url)
+            baseline = None
+            for encoding in encodings:
+                size, cpu = 0, 0.0
+                for _ in range(count):
+                    started = time.process_time()
+                    # With a query string the response cache is skipped, so
+                    # each request renders and compresses the page again.
+                    response = client.get(url, headers={'Accept-Encoding': encoding})
+                    size = len(response.get_data())
+                    cpu += time.process_time() - started
+                baseline = baseline or size
+                print(f'  {encoding:>8}: {size:>8} bytes ({size / baseline:6.1%}), {cpu / count * 1000:6.2f} ms CPU/request')
+
+
+def _busiest_recipe():
+    from models import Recipe
+
+    return Recipe.query.with_entities(Recipe.id).order_by(Recipe.comments_count.desc()).limit(1).scalar()
@@ -0,0 +1,129 @@
+import hashlib
+from datetime import timezone
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import func, select
+from werkzeug.http import http_date
+
+from config import db
+from models import User, Recipe, Comment, Like, Favorite, Notification
+from pagination import parse_limit, keyset_page
+
+
+def _latest_id(model):
+    return select(func.max(model.id)).where(model.recipe_id == Recipe.id).scalar_subquery()
+
+
+# The newest profile edit anywhere, one seek on ix_users_updated_at. Authors,
+# commenters and notification actors are embedded by username and picture,
+# and a rename is rare enough that it can invalidate every page.
+IDENTITY_VERSION = select(func.max(User.updated_at)).scalar_subquery()
+
+# Counts plus the newest row id of each child table change whenever a child
+# row is added or removed, even when an add and a delete cancel out.
+RECIPE_VERSION = (
+    Recipe.id, Recipe.created_at, Recipe.updated_at,
+    Recipe.likes_count, Recipe.favorites_count, Recipe.comments_count,
+    _latest_id(Like), _latest_id(Favorite), _latest_id(Comment), IDENTITY_VERSION.label('identity_version')
+)
+
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def conditional(validators):
+    """Answer conditional GETs from ``validators`` before the view runs.
+
+    ``validators`` receives the view's URL arguments and returns
+    ``(etag, last_modified)``, or ``None`` when the view should just run (e.g.
+    the resource does not exist). Matching requests get a bare 304; otherwise
+    the validators are attached to the view's 200 response.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, **kwargs):
+            versions = validators(**kwargs)
+            if versions is None:
+                return func(self, **kwargs)
+
+            etag, last_modified = versions
+            headers = {'ETag': f'"{etag}"'}
+            if last_modified is not None:
+                last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+                headers['Last-Modified'] = http_date(last_modified)
+
+            if request.if_none_match:
+                # Weak comparison: compression weakens the ETags it sends.
+                fresh = request.if_none_match.contains_weak(etag)
+            else:
+                fresh = (
+                    last_modified is not None and request.if_modified_since is not None
+                    and last_modified <= request.if_modified_since
+                )
+            if fresh:
+                response = make_response('', 304)
+                response.headers.update(headers)
+                return response
+
+            body, status, *rest = func(self, **kwargs)
+            if status != 200:
+                return (body, status, *rest)
+            return body, status, {**(rest[0] if rest else {}), **headers}
+        return wrapper
+    return decorator
+
+
+def _last_modified(row):
+    return max(filter(None, (row.updated_at or row.created_at, row.identity_version)), default=None)
+
+
+def _include():
+    return sorted(set(request.args.get('include', '').split(',')) & {'likes', 'favorites', 'comments'})
+
+
+def recipe_validators(id):
+    row = db.session.query(*RECIPE_VERSION).filter(Recipe.id == id).first()
+    if row is None:
+        return None
+    return make_etag('recipe', _include(), *row), _last_modified(row)
+
+
+def recipe_comments_validators(recipe_id):
+    row = db.session.query(
+        Recipe.updated_at, Recipe.created_at, Recipe.comments_count, _latest_id(Comment),
+        IDENTITY_VERSION.label('identity_version')
+    ).filter(Recipe.id == recipe_id).first()
+    if row is None:
+        return None
+    page = (request.args.get('cursor'), request.args.get('limit'), request.args.get('since'))
+    return make_etag('recipe_comments', recipe_id, page, *row), _last_modified(row)
+
+
+def feed_validators():
+    include = _include()
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        rows, next_cursor = keyset_page(
+            db.session.query(*RECIPE_VERSION), Recipe.created_at, Recipe.id, request.args.get('cursor'), limit
+        )
+    except ValueError:
+        return None
+    # A page's Last-Modified cannot see rows leaving it, so lists only get an ETag.
+    return make_etag('recipes', include, next_cursor, *[tuple(row) for row in rows]), None
+
+
+def notification_validators(user_id):
+    if session.get('user_id') != user_id:
+        return None
+    # New notifications raise max(id); reads, purges and renamed recipes
+    # bump notifications_version. No per-notification scan either way.
+    row = db.session.query(
+        User.unread_notifications, User.notifications_version,
+        select(func.max(Notification.id)).where(Notification.user_id == user_id).scalar_subquery(), IDENTITY_VERSION
+    ).filter(User.id == user_id).first()
+    if row is None:
+        return None
+    page = (request.args.get('cursor'), request.args.get('limit'))
+    return make_etag('notifications', user_id, page, *row), None
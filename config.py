@@ -7,27 +7,126 @@ from flask_restful import Api
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from flask_bcrypt import Bcrypt
+from werkzeug.middleware.proxy_fix import ProxyFix
+from instrumentation import QueryInstrumentation
+from engine import EngineProfile
+from compression import Compression
+from replicas import RoutingSession, replicas, replica_binds
+
+def env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', 'sqlite:///app.db')
+app.config['SQLALCHEMY_BINDS'] = replica_binds(os.environ.get('DATABASE_REPLICA_URIS', ''))
+app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+app.config['REPLICA_RETRY_SECONDS'] = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ECHO'] = True
+app.config['SQLALCHEMY_ECHO'] = env_flag('SQLALCHEMY_ECHO')
+app.config['QUERY_INSTRUMENTATION'] = env_flag('QUERY_INSTRUMENTATION', True)
+app.config['QUERY_NPLUS1_THRESHOLD'] = int(os.environ.get('QUERY_NPLUS1_THRESHOLD', 5))
+app.config['QUERY_LOG_JSON'] = env_flag('QUERY_LOG_JSON')
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+app.config['LOGIN_IP_LIMIT'] = int(os.environ.get('LOGIN_IP_LIMIT', 20))
+app.config['LOGIN_IP_WINDOW'] = int(os.environ.get('LOGIN_IP_WINDOW', 300))
+app.config['LOGIN_USER_FAILURE_LIMIT'] = int(os.environ.get('LOGIN_USER_FAILURE_LIMIT', 5))
+app.config['LOGIN_USER_WINDOW'] = int(os.environ.get('LOGIN_USER_WINDOW', 900))
+app.config['USERNAME_BLOOM_FILTER'] = env_flag('USERNAME_BLOOM_FILTER', True)
+app.config['USERNAME_BLOOM_CAPACITY'] = int(os.environ.get('USERNAME_BLOOM_CAPACITY', 100000))
+app.config['USERNAME_BLOOM_ERROR_RATE'] = float(os.environ.get('USERNAME_BLOOM_ERROR_RATE', 0.01))
+app.config['USERNAME_BLOOM_REFRESH'] = int(os.environ.get('USERNAME_BLOOM_REFRESH', 300))
+app.config['IDEMPOTENCY_TTL'] = int(os.environ.get('IDEMPOTENCY_TTL', 24 * 60 * 60))
+app.config['WRITE_BEHIND'] = env_flag('WRITE_BEHIND')
+app.config['WRITE_BEHIND_INTERVAL_MS'] = int(os.environ.get('WRITE_BEHIND_INTERVAL_MS', 250))
+app.config['WRITE_BEHIND_MAX_BATCH'] = int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 500))
+app.config['WRITE_BEHIND_JOURNAL_DIR'] = os.environ.get('WRITE_BEHIND_JOURNAL_DIR', os.path.join(app.instance_path, 'write-behind'))
+app.config['WRITE_BEHIND_FSYNC'] = env_flag('WRITE_BEHIND_FSYNC')
+app.config['TRENDING_WEIGHTS'] = {'like': 3.0, 'favorite': 2.0, 'comment': 4.0}
+app.config['TRENDING_HALF_LIVES_HOURS'] = {
+    'day': float(os.environ.get('TRENDING_DAY_HALF_LIFE_HOURS', 24)),
+    'week': float(os.environ.get('TRENDING_WEEK_HALF_LIFE_HOURS', 7 * 24)),
+}
+app.config['TRENDING_MIN_SCORE'] = 1e-6
+app.config['TIMELINE_FANOUT_LIMIT'] = int(os.environ.get('TIMELINE_FANOUT_LIMIT', 10000))
+app.config['TIMELINE_BACKFILL'] = int(os.environ.get('TIMELINE_BACKFILL', 20))
+app.config['TRUSTED_PROXY_HOPS'] = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
 app.config['SESSION_COOKIE_SAMESITE'] = 'None'
 app.config['SESSION_COOKIE_SECURE'] = True
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
-app.json.compact = False
+app.config['UPLOAD_URL_PREFIX'] = os.environ.get('UPLOAD_URL_PREFIX', 'https://grab-a-grub-backend.onrender.com/uploads')
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'local')
+app.config['STORAGE_S3_BUCKET'] = os.environ.get('STORAGE_S3_BUCKET')
+app.config['STORAGE_S3_PREFIX'] = os.environ.get('STORAGE_S3_PREFIX', '')
+app.config['STORAGE_S3_ENDPOINT_URL'] = os.environ.get('STORAGE_S3_ENDPOINT_URL')
+app.config['UPLOADS_OFFLOAD'] = os.environ.get('UPLOADS_OFFLOAD')
+app.config['UPLOADS_ACCEL_PREFIX'] = os.environ.get('UPLOADS_ACCEL_PREFIX', '/protected-uploads')
+app.config['UPLOADS_MAX_AGE'] = int(os.environ.get('UPLOADS_MAX_AGE', 24 * 60 * 60))
+app.config['IMAGE_VARIANT_SIZES'] = (48, 160, 512)
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+app.config['NOTIFICATION_RETENTION_DAYS'] = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 30))
+app.config['SSE_BROKER_BACKEND'] = os.environ.get('SSE_BROKER_BACKEND', 'local')
+app.config['SSE_REDIS_URL'] = os.environ.get('SSE_REDIS_URL')
+app.config['SSE_KEEPALIVE_SECONDS'] = int(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+app.config['SSE_RETRY_MS'] = 5000
+app.config['SSE_REPLAY_PAGE_SIZE'] = 500
+app.config['SEARCH_BACKEND'] = os.environ.get('SEARCH_BACKEND', 'auto')
+app.config['CACHE_BACKEND'] = os.environ.get('CACHE_BACKEND', 'memory')
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 30))
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'tuned')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 64 * 1024))
+app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+# Compact JSON unless JSON_PRETTY is set; debug mode also indents.
+app.config['JSON_PRETTY'] = env_flag('JSON_PRETTY')
+app.config['RESTFUL_JSON'] = {'indent': 2} if app.config['JSON_PRETTY'] else {'separators': (',', ':')}
+app.json.compact = not app.config['JSON_PRETTY']
+app.config['COMPRESS'] = env_flag('COMPRESS', True)
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+# Behind a proxy (Render's router) every request comes from the proxy's
+# address; take the client's from the X-Forwarded-For entries the trusted
+# hops appended. Off unless configured, since a client reaching the app
+# directly could write that header itself.
+if app.config['TRUSTED_PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_HOPS'], x_proto=app.config['TRUSTED_PROXY_HOPS'])
 
 metadata = MetaData(naming_convention={
+    "ix": "ix_%(column_0_label)s",
     "fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s",
 })
-db = SQLAlchemy(metadata=metadata)
+engine_profile = EngineProfile(app)
+db = SQLAlchemy(metadata=metadata, session_options={'class_': RoutingSession})
 migrate = Migrate(app, db)
 db.init_app(app)
+with app.app_context():
+    for engine in db.engines.values():
+        engine_profile.init_engine(engine)
+replicas.init_app(app, db)
 
 api = Api(app)
 
 CORS(app, origins=["https://grab-a-grub-frontend.onrender.com", "http://localhost:3000", "http://localhost:5173"], supports_credentials=True, allow_headers=["Content-Type", "Authorization"], methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"])
 
-bcrypt = Bcrypt(app)
\ No newline at end of file
+bcrypt = Bcrypt(app)
+
+QueryInstrumentation(app)
+
+Compression(app)
\ No newline at end of file
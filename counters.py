@@ -0,0 +1,54 @@
+from sqlalchemy import func, select
+
+from config import app, db
+from models import User, Recipe, Comment, Like, Favorite, Follow, Notification
+
+RECIPE_COUNTERS = ('likes_count', 'favorites_count', 'comments_count')
+USER_COUNTERS = ('recipe_count', 'likes_received', 'follower_count', 'following_count', 'unread_notifications')
+
+
+def _bump(model, id, deltas):
+    values = {getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    model.query.filter(model.id == id).update(values, synchronize_session=False)
+
+
+def bump_recipe_counters(recipe_id, **deltas):
+    _bump(Recipe, recipe_id, deltas)
+
+
+def bump_user_counters(user_id, **deltas):
+    _bump(User, user_id, deltas)
+
+
+def reconcile_counters():
+    def count_for_recipe(model):
+        return select(func.count(model.id)).where(model.recipe_id == Recipe.id).scalar_subquery()
+
+    Recipe.query.update({
+        Recipe.likes_count: count_for_recipe(Like),
+        Recipe.favorites_count: count_for_recipe(Favorite),
+        Recipe.comments_count: count_for_recipe(Comment)
+    }, synchronize_session=False)
+
+    User.query.update({
+        User.recipe_count: select(func.count(Recipe.id)).where(Recipe.user_id == User.id).scalar_subquery(),
+        User.likes_received: select(func.count(Like.id)).join(Recipe, Like.recipe_id == Recipe.id).where(
+            Recipe.user_id == User.id
+        ).scalar_subquery(),
+        User.follower_count: select(func.count(Follow.id)).where(Follow.followed_id == User.id).scalar_subquery(),
+        User.following_count: select(func.count(Follow.id)).where(Follow.follower_id == User.id).scalar_subquery(),
+        User.unread_notifications: select(func.count(Notification.id)).where(
+            Notification.user_id == User.id, Notification.read_status == False
+        ).scalar_subquery()
+    }, synchronize_session=False)
+
+    db.session.commit()
+
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Rebuild the denormalized engagement counters from the source tables."""
+    reconcile_counters()
+    print("Counters reconciled.")
@@ -0,0 +1,192 @@
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+import click
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+
+
+def sqlite_pragmas(config):
+    return (
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        # Negative cache_size is in KiB rather than pages.
+        ('cache_size', -config['SQLITE_CACHE_SIZE_KB']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('temp_store', 'MEMORY'),
+    )
+
+
+def pragma_listener(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_pragmas
+
+
+def in_memory(url):
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def engine_options(config):
+    """Engine and pool options for ``DB_PROFILE=tuned``."""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = {}
+    if not in_memory(url):
+        # An in-memory database lives in one connection on a StaticPool,
+        # which takes no queue options.
+        options.update(
+            pool_size=config['DB_POOL_SIZE'],
+            max_overflow=config['DB_MAX_OVERFLOW'],
+            pool_timeout=config['DB_POOL_TIMEOUT'],
+        )
+    if url.get_backend_name() == 'sqlite':
+        # sqlite3's own lock wait, on top of the busy_timeout pragma.
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+    else:
+        # Server connections can be dropped by the database or a proxy
+        # while idle in the pool; test them on checkout and retire them
+        # before the server's idle timeout.
+        options['pool_pre_ping'] = True
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']
+    return options
+
+
+class EngineProfile:
+    """Applies ``DB_PROFILE``: ``tuned`` (the default) sets the pool options
+    above and, for SQLite, WAL mode and the other pragmas on every new
+    connection; ``default`` leaves SQLAlchemy's defaults alone.
+
+    ``init_app`` must run before Flask-SQLAlchemy creates the engine and
+    ``init_engine`` after.
+    """
+
+    def __init__(self, app=None):
+        self.tuned = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        _register_commands(app)
+        if app.config['DB_PROFILE'] not in ('default', 'tuned'):
+            raise ValueError(f"Unknown DB_PROFILE: {app.config['DB_PROFILE']}")
+        self.tuned = app.config['DB_PROFILE'] == 'tuned'
+        if not self.tuned:
+            return
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        for key, value in engine_options(app.config).items():
+            options.setdefault(key, value)
+        self.pragmas = sqlite_pragmas(app.config)
+
+    def init_engine(self, engine):
+        if self.tuned and engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', pragma_listener(self.pragmas))
+
+
+def _benchmark_engine(url, config, tuned):
+    engine = create_engine(url, **(engine_options(config) if tuned else {}))
+    if tuned:
+        event.listen(engine, 'connect', pragma_listener(sqlite_pragmas(config)))
+    return engine
+
+
+def _benchmark_reader(url, config, tuned, stop, results):
+    from models import Recipe
+
+    engine = _benchmark_engine(url, config, tuned)
+    feed = select(Recipe.id, Recipe.title, Recipe.created_at).order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(20)
+    latencies, errors = [], 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with engine.connect() as connection:
+                connection.execute(feed).all()
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    results.put(('read', latencies, errors))
+
+
+def _benchmark_writer(url, config, tuned, stop, results):
+    from models import Comment
+
+    engine = _benchmark_engine(url, config, tuned)
+    writes, errors = 0, 0
+    while not stop.is_set():
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Comment), [
+                    {'content': 'Looks great!', 'user_id': 1, 'recipe_id': i} for i in range(1, 51)
+                ])
+            writes += 1
+        except OperationalError:
+            errors += 1
+    results.put(('write', writes, errors))
+
+
+def run_benchmark(url, config, tuned, readers, writers, seconds):
+    """Readers and writers run in separate processes, like web workers
+    sharing one database file."""
+    from models import User, Recipe
+
+    engine = _benchmark_engine(url, config, tuned)
+    User.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(User), [{'username': 'bench', 'email': 'bench@example.com', '_password_hash': 'x'}])
+        connection.execute(insert(Recipe), [
+            {'title': f'Recipe {i}', 'ingredients': 'water and salt', 'instructions': 'boil it well',
+             'cooking_time': 10, 'user_id': 1}
+            for i in range(2000)
+        ])
+    engine.dispose()
+
+    context = multiprocessing.get_context('fork')
+    stop, results = context.Event(), context.Queue()
+    processes = [context.Process(target=_benchmark_reader, args=(url, config, tuned, stop, results)) for _ in range(readers)]
+    processes += [context.Process(target=_benchmark_writer, args=(url, config, tuned, stop, results)) for _ in range(writers)]
+    for process in processes:
+        process.start()
+    time.sleep(seconds)
+    stop.set()
+
+    latencies, writes, errors = [], 0, 0
+    for _ in processes:
+        kind, done, failed = results.get()
+        if kind == 'read':
+            latencies.extend(done)
+        else:
+            writes += done
+        errors += failed
+    for process in processes:
+        process.join()
+
+    p99 = statistics.quantiles(latencies, n=100)[98] * 1000 if len(latencies) > 1 else float('nan')
+    return (
+        f'{len(latencies) / seconds:.0f} reads/s, read p99 {p99:.1f}ms, '
+        f'{writes / seconds:.0f} write txns/s, {errors} errors'
+    )
+
+
+def _register_commands(app):
+    @app.cli.command('benchmark-sqlite')
+    @click.option('--readers', default=4, help='Processes reading the recipe feed.')
+    @click.option('--writers', default=2, help='Processes inserting batches of comments.')
+    @click.option('--seconds', default=5, help='Duration of each run.')
+    def benchmark_sqlite_command(readers, writers, seconds):
+        """Compare read throughput under concurrent writes on a scratch SQLite
+        database, with SQLAlchemy's defaults and with DB_PROFILE=tuned."""
+        for tuned in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                url = f'sqlite:///{directory}/benchmark.db'
+                config = dict(app.config, SQLALCHEMY_DATABASE_URI=url)
+                result = run_benchmark(url, config, tuned, readers, writers, seconds)
+                print(f"{'tuned' if tuned else 'default'}: {result}")
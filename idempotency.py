@@ -0,0 +1,48 @@
+import hashlib
+from functools import wraps
+
+from flask import request, session
+
+from cache import cache, LRUCache, StoreCache
+from config import app
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+
+def create_response_store(cache, ttl):
+    """Remembered responses live next to the cache, in the shared store when
+    there is one so a retry landing on another worker is still recognised."""
+    if isinstance(cache, StoreCache):
+        return StoreCache(cache.client, ttl=ttl, prefix=cache.prefix + 'idempotency:')
+    return LRUCache(max_entries=10000, ttl=ttl)
+
+
+responses = create_response_store(cache, app.config['IDEMPOTENCY_TTL'])
+
+
+def idempotent(func):
+    """Replay the first successful response to a request carrying the same
+    ``Idempotency-Key`` header, for the same user and endpoint, instead of
+    running it again. Requests without the header run as usual."""
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return func(self, *args, **kwargs)
+        if len(key) > 255:
+            return {'error': f'{IDEMPOTENCY_HEADER} must be at most 255 characters'}, 400
+
+        store_key = f"{session.get('user_id')}:{request.method}:{request.path}:{key}"
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        stored = responses.get(store_key)
+        if stored is not None:
+            if stored[0] != fingerprint:
+                return {'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}, 422
+            body, status = stored[1]
+            return body, status, {'Idempotent-Replayed': 'true'}
+
+        response = func(self, *args, **kwargs)
+        if 200 <= response[1] < 300:
+            responses.set(store_key, (fingerprint, response[:2]))
+        return response
+    return wrapper
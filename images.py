@@ -0,0 +1,137 @@
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from sqlalchemy import insert
+
+from cache import LRUCache
+from config import app, db
+from models import ImageVariant
+from storage import storage, VARIANTS_PREFIX
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+logger = logging.getLogger('grab_a_grub.images')
+
+# Pillow format name, file extension and encoder options per output type.
+# Re-encoding without passing ``exif`` drops EXIF/GPS and other metadata.
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _flatten(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def generate_variants(key):
+    """Write square crops of a stored image at every configured size, as
+    WebP and JPEG, and record them. Returns the number of variants written."""
+    stem = key.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+
+    with storage.open(key) as blob, Image.open(blob) as original:
+        original.draft('RGB', (max(app.config['IMAGE_VARIANT_SIZES']),) * 2)
+        source = ImageOps.exif_transpose(original)
+        rgb = _flatten(source)
+
+        rows = []
+        for size in app.config['IMAGE_VARIANT_SIZES']:
+            for format, (pillow_format, extension, options) in FORMATS.items():
+                image = source if format == 'webp' and source.mode == 'RGBA' else rgb
+                variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                encoded = io.BytesIO()
+                variant.save(encoded, pillow_format, **options)
+                path = f'{VARIANTS_PREFIX}{stem}-{size}.{extension}'
+                storage.put(path, encoded.getvalue())
+                rows.append({
+                    'source': key, 'size': size, 'format': format, 'path': path,
+                    'bytes': encoded.tell()
+                })
+
+    ImageVariant.query.filter(ImageVariant.source == key).delete(synchronize_session=False)
+    db.session.execute(insert(ImageVariant), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def _process(key):
+    with app.app_context():
+        # A deduplicated upload already has its variants.
+        if ImageVariant.query.filter(ImageVariant.source == key).first():
+            return
+        try:
+            generate_variants(key)
+        except Exception:
+            db.session.rollback()
+            logger.exception('Could not generate image variants for %s', key)
+
+
+class ImagePipeline:
+    """Generates image variants on a small thread pool, off the request
+    path. Pillow releases the GIL while decoding and resizing, so threads
+    keep several cores busy without the startup cost of processes."""
+
+    def __init__(self, max_workers):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-variants')
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def submit(self, key):
+        if not self.enabled:
+            return None
+        return self.executor.submit(_process, key)
+
+
+image_pipeline = ImagePipeline(app.config['IMAGE_WORKERS'])
+
+# Variants never change once generated, so lookups are remembered; misses
+# are not, since the pipeline may still be working on them.
+_variant_paths = LRUCache(max_entries=4096, ttl=60 * 60)
+
+
+def pick_variant(key, size, accept_webp):
+    """Path of the smallest variant at least ``size`` pixels wide (or the
+    largest there is), or ``None`` when none has been generated yet."""
+    format = 'webp' if accept_webp else 'jpeg'
+    variants = _variant_paths.get((key, format))
+    if variants is None:
+        variants = ImageVariant.query.with_entities(ImageVariant.size, ImageVariant.path).filter(
+            ImageVariant.source == key, ImageVariant.format == format
+        ).order_by(ImageVariant.size).all()
+        if variants:
+            _variant_paths.set((key, format), variants)
+    for variant_size, path in variants:
+        if variant_size >= size:
+            return path
+    return variants[-1].path if variants else None
+
+
+@app.cli.command('generate-image-variants')
+@click.option('--missing-only', is_flag=True, help='Skip uploads that already have variants.')
+def generate_image_variants_command(missing_only):
+    """Generate resized variants for every stored upload."""
+    if Image is None:
+        raise click.ClickException("Generating image variants requires Pillow (pip install Pillow)")
+    done = {source for source, in db.session.query(ImageVariant.source).distinct()} if missing_only else set()
+    count = 0
+    for key, _ in sorted(storage.list()):
+        if key in done or key.startswith(VARIANTS_PREFIX):
+            continue
+        try:
+            count += generate_variants(key)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Skipped {key}: {e}")
+    print(f"Wrote {count} image variants.")
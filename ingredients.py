@@ -0,0 +1,235 @@
+import bisect
+import heapq
+import re
+from collections import Counter, namedtuple
+
+import click
+from sqlalchemy import func, insert
+
+from config import app, db
+from models import Recipe, RecipeIngredient
+
+ParsedIngredient = namedtuple('ParsedIngredient', ['quantity', 'unit', 'name', 'raw'])
+
+UNITS = {
+    'g': 'g', 'gram': 'g', 'grams': 'g',
+    'kg': 'kg', 'kilogram': 'kg', 'kilograms': 'kg',
+    'mg': 'mg',
+    'ml': 'ml', 'millilitre': 'ml', 'milliliter': 'ml', 'millilitres': 'ml', 'milliliters': 'ml',
+    'l': 'l', 'litre': 'l', 'liter': 'l', 'litres': 'l', 'liters': 'l',
+    'tsp': 'tsp', 'teaspoon': 'tsp', 'teaspoons': 'tsp',
+    'tbsp': 'tbsp', 'tbs': 'tbsp', 'tablespoon': 'tbsp', 'tablespoons': 'tbsp',
+    'cup': 'cup', 'cups': 'cup',
+    'oz': 'oz', 'ounce': 'oz', 'ounces': 'oz',
+    'lb': 'lb', 'lbs': 'lb', 'pound': 'lb', 'pounds': 'lb',
+    'pinch': 'pinch', 'pinches': 'pinch',
+    'dash': 'dash', 'dashes': 'dash',
+    'clove': 'clove', 'cloves': 'clove',
+    'can': 'can', 'cans': 'can',
+    'slice': 'slice', 'slices': 'slice',
+    'stick': 'stick', 'sticks': 'stick',
+    'bunch': 'bunch', 'bunches': 'bunch',
+    'handful': 'handful', 'handfuls': 'handful',
+}
+
+# Words that describe an ingredient rather than name it; "4 large eggs" and
+# "2 eggs" must land in the same posting list.
+DESCRIPTORS = {
+    'large', 'medium', 'small', 'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced',
+    'grated', 'shredded', 'crushed', 'finely', 'roughly', 'peeled', 'melted', 'softened',
+    'whole', 'optional', 'to', 'taste', 'for', 'serving', 'about', 'of',
+}
+
+IRREGULAR_PLURALS = {'leaves': 'leaf', 'loaves': 'loaf', 'halves': 'half', 'knives': 'knife'}
+UNCOUNTABLE = {'asparagus', 'couscous', 'hummus', 'molasses', 'swiss', 'grits', 'series'}
+
+VULGAR_FRACTIONS = {'½': 0.5, '⅓': 1 / 3, '⅔': 2 / 3, '¼': 0.25, '¾': 0.75, '⅛': 0.125}
+
+_NUMBER = r'\d+/\d+|\d+(?:\.\d+)?|[½⅓⅔¼¾⅛]'
+# "2", "3/4", "1 1/2", "1½", "2-3" (a range keeps its lower bound), "a"/"an".
+_QUANTITY = re.compile(
+    rf'^(?:(?P<amount>(?:{_NUMBER})(?:\s*(?:\d+/\d+|[½⅓⅔¼¾⅛]))?)(?:\s*(?:-|–|to)\s*(?:{_NUMBER}))?'
+    r'|(?P<article>an?)(?=\s))\s*',
+    re.IGNORECASE
+)
+_UNIT = re.compile(r'^(?P<unit>[a-zA-Z]+)\.?(?=\s|$)\s*')
+_PARENTHETICAL = re.compile(r'\([^)]*\)')
+_WORD = re.compile(r"[a-z][a-z'-]*")
+_SEPARATORS = re.compile(r'[,;\n]+')
+
+
+def singularize(word):
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if word in UNCOUNTABLE or len(word) <= 3:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def canonical_name(text):
+    words = [word for word in _WORD.findall(_PARENTHETICAL.sub(' ', text.lower())) if word not in DESCRIPTORS]
+    if not words:
+        return None
+    words[-1] = singularize(words[-1])
+    return ' '.join(words)[:100]
+
+
+def _parse_quantity(amount):
+    quantity = 0.0
+    for part in re.findall(_NUMBER, amount):
+        if part in VULGAR_FRACTIONS:
+            quantity += VULGAR_FRACTIONS[part]
+        elif '/' in part:
+            numerator, denominator = part.split('/')
+            quantity += int(numerator) / int(denominator) if int(denominator) else 0
+        else:
+            quantity += float(part)
+    return quantity
+
+
+def parse_ingredient(text):
+    """Split one ingredient line into quantity, unit and canonical name.
+
+    ``"400g spaghetti"`` gives ``(400.0, 'g', 'spaghetti')`` and
+    ``"1 1/2 cups of brown sugar"`` gives ``(1.5, 'cup', 'brown sugar')``.
+    Returns ``None`` when nothing is left to name an ingredient.
+    """
+    raw = text.strip()
+    quantity, unit, rest = None, None, raw
+    match = _QUANTITY.match(rest)
+    if match:
+        quantity = _parse_quantity(match.group('amount')) if match.group('amount') else 1.0
+        rest = rest[match.end():]
+
+    unit_match = _UNIT.match(rest)
+    if unit_match and unit_match.group('unit').lower() in UNITS and rest[unit_match.end():].strip():
+        unit = UNITS[unit_match.group('unit').lower()]
+        rest = rest[unit_match.end():]
+
+    name = canonical_name(rest)
+    if name is None:
+        return None
+    return ParsedIngredient(quantity, unit, name, raw[:255])
+
+
+def parse_ingredients(text):
+    parsed = (parse_ingredient(part) for part in _SEPARATORS.split(text or '') if part.strip())
+    return [ingredient for ingredient in parsed if ingredient is not None]
+
+
+def _ingredient_rows(recipe_id, text):
+    return [
+        {'recipe_id': recipe_id, 'position': position, **ingredient._asdict()}
+        for position, ingredient in enumerate(parse_ingredients(text))
+    ]
+
+
+def set_recipe_ingredients(recipe):
+    """Replace the parsed rows for ``recipe``; runs in the caller's transaction."""
+    RecipeIngredient.query.filter(RecipeIngredient.recipe_id == recipe.id).delete(synchronize_session=False)
+    rows = _ingredient_rows(recipe.id, recipe.ingredients)
+    if rows:
+        db.session.execute(insert(RecipeIngredient), rows)
+
+
+def backfill_ingredients(batch_size=500):
+    """Parse every recipe's ingredients, one keyset batch per transaction, so
+    memory stays flat however many recipes there are."""
+    last_id, total = 0, 0
+    while True:
+        batch = db.session.query(Recipe.id, Recipe.ingredients).filter(
+            Recipe.id > last_id
+        ).order_by(Recipe.id).limit(batch_size).all()
+        if not batch:
+            return total
+        ids = [recipe_id for recipe_id, _ in batch]
+        RecipeIngredient.query.filter(RecipeIngredient.recipe_id.in_(ids)).delete(synchronize_session=False)
+        rows = [row for recipe_id, text in batch for row in _ingredient_rows(recipe_id, text)]
+        if rows:
+            db.session.execute(insert(RecipeIngredient), rows)
+        db.session.commit()
+        last_id, total = ids[-1], total + len(batch)
+
+
+def posting_lists(names):
+    """Sorted ids of the recipes using each name, read off the (name,
+    recipe_id) index in one pass. Unknown names get an empty list."""
+    postings = {name: [] for name in names}
+    for name, recipe_id in db.session.query(RecipeIngredient.name, RecipeIngredient.recipe_id).filter(
+        RecipeIngredient.name.in_(postings)
+    ).distinct().order_by(RecipeIngredient.name, RecipeIngredient.recipe_id):
+        postings[name].append(recipe_id)
+    return list(postings.values())
+
+
+def intersect(*postings):
+    """Intersect sorted id lists, shortest first; each probe into a longer
+    list gallops forward with bisect instead of stepping one id at a time."""
+    postings = sorted(postings, key=len)
+    if not postings:
+        return []
+    result = postings[0]
+    for other in postings[1:]:
+        matched, start = [], 0
+        for recipe_id in result:
+            start = bisect.bisect_left(other, recipe_id, start)
+            if start == len(other):
+                break
+            if other[start] == recipe_id:
+                matched.append(recipe_id)
+        result = matched
+        if not result:
+            break
+    return result
+
+
+def union(*postings):
+    result = []
+    for recipe_id in heapq.merge(*postings):
+        if not result or result[-1] != recipe_id:
+            result.append(recipe_id)
+    return result
+
+
+def recipes_with_all(names):
+    return intersect(*posting_lists(names))
+
+
+def recipes_with_any(names):
+    return union(*posting_lists(names))
+
+
+def recipes_using_only(names):
+    """Recipes whose every ingredient is among ``names`` (the pantry query)."""
+    postings = posting_lists(set(names))
+    matched = Counter(recipe_id for posting in postings for recipe_id in posting)
+    candidates = union(*postings)
+    result = []
+    for start in range(0, len(candidates), 500):
+        chunk = candidates[start:start + 500]
+        totals = dict(db.session.query(
+            RecipeIngredient.recipe_id, func.count(RecipeIngredient.name.distinct())
+        ).filter(RecipeIngredient.recipe_id.in_(chunk)).group_by(RecipeIngredient.recipe_id))
+        result.extend(recipe_id for recipe_id in chunk if totals.get(recipe_id) == matched[recipe_id])
+    return result
+
+
+INGREDIENT_MATCHERS = {
+    'all': recipes_with_all,
+    'any': recipes_with_any,
+    'only': recipes_using_only,
+}
+
+
+@app.cli.command('backfill-ingredients')
+@click.option('--batch-size', type=int, default=500, show_default=True)
+def backfill_ingredients_command(batch_size):
+    """Parse ingredients for every recipe into recipe_ingredients."""
+    total = backfill_ingredients(batch_size)
+    print(f"Parsed ingredients for {total} recipes.")
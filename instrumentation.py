@@ -0,0 +1,130 @@
+import json
+import logging
+import re
+import sys
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('grab_a_grub.queries')
+
+_WHITESPACE = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PARAM_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+
+
+def statement_shape(statement):
+    """Normalize a SQL statement so executions that differ only in their
+    literals or IN-list lengths compare equal."""
+    shape = _WHITESPACE.sub(' ', statement).strip()
+    shape = _LITERALS.sub('?', shape)
+    return _PARAM_LISTS.sub('(?)', shape)
+
+
+class QueryStats:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.count = 0
+        self.total = 0.0
+        self.slowest = (0.0, None)
+        self.shapes = Counter()
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.slowest[0]:
+            self.slowest = (duration, statement)
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold):
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > threshold]
+
+
+class QueryInstrumentation:
+    """Per-request database metrics: query count, total and slowest query
+    time, and repeated statement shapes (the signature of an N+1 loop).
+
+    Results go out as a ``Server-Timing`` header; N+1 suspects are logged as
+    warnings, and ``QUERY_LOG_JSON`` adds one JSON log line per request.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_INSTRUMENTATION', True)
+        app.config.setdefault('QUERY_NPLUS1_THRESHOLD', 5)
+        app.config.setdefault('QUERY_LOG_JSON', False)
+        if not app.config['QUERY_INSTRUMENTATION']:
+            return
+
+        if app.config['QUERY_LOG_JSON'] and not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(_start_request)
+        app.after_request(lambda response: _finish_request(app, response))
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('query_stats')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats() is not None:
+        conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats()
+    started = conn.info.get('query_started_at')
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+def _start_request():
+    g.query_stats = QueryStats()
+
+
+def _finish_request(app, response):
+    stats = g.pop('query_stats', None)
+    if stats is None:
+        return response
+
+    elapsed_ms = (time.perf_counter() - stats.started_at) * 1000
+    db_ms = stats.total * 1000
+    slowest_ms = stats.slowest[0] * 1000
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={db_ms:.2f};desc="{stats.count} queries", '
+        f'db-slowest;dur={slowest_ms:.2f}, app;dur={elapsed_ms:.2f}'
+    )
+
+    repeated = stats.repeated(app.config['QUERY_NPLUS1_THRESHOLD'])
+    for shape, count in repeated:
+        logger.warning('Possible N+1 in %s %s: statement ran %d times: %s',
+                       request.method, request.path, count, shape)
+
+    if app.config['QUERY_LOG_JSON']:
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed_ms, 2),
+            'queries': stats.count,
+            'db_ms': round(db_ms, 2),
+            'slowest_ms': round(slowest_ms, 2),
+            'slowest_statement': statement_shape(stats.slowest[1]) if stats.slowest[1] else None,
+            'repeated_statements': [{'count': count, 'statement': shape} for shape, count in repeated]
+        }))
+    return response
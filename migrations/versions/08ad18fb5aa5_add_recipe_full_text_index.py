@@ -0,0 +1,42 @@
+"""Add FTS5 full text index over recipes
+
+Revision ID: 08ad18fb5aa5
+Revises: 8b41b15d50dc
+Create Date: 2026-10-17 20:45:04.466509
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '08ad18fb5aa5'
+down_revision = '8b41b15d50dc'
+branch_labels = None
+depends_on = None
+
+
+def _fts5_available(bind):
+    if bind.dialect.name != 'sqlite':
+        return False
+    return any(row[0] == 'ENABLE_FTS5' for row in bind.exec_driver_sql('PRAGMA compile_options'))
+
+
+def upgrade():
+    # Other databases fall back to the in-process index in search.py.
+    bind = op.get_bind()
+    if not _fts5_available(bind):
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts "
+        "USING fts5(title, description, ingredients, tokenize='unicode61')"
+    )
+    op.execute(
+        "INSERT INTO recipes_fts (rowid, title, description, ingredients) "
+        "SELECT id, title, coalesce(description, ''), ingredients FROM recipes"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS recipes_fts")
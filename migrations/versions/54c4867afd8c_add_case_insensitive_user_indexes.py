@@ -0,0 +1,28 @@
+"""Add case-insensitive unique indexes on usernames and emails
+
+Revision ID: 54c4867afd8c
+Revises: d873a67be728
+Create Date: 2026-10-17 22:14:05.118342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54c4867afd8c'
+down_revision = 'd873a67be728'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Expression indexes are not autogenerated; fails if existing rows
+    # differ only by case, which have to be merged by hand first.
+    op.create_index('uq_users_username_lower', 'users', [sa.text('lower(username)')], unique=True)
+    op.create_index('uq_users_email_lower', 'users', [sa.text('lower(email)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_users_email_lower', table_name='users')
+    op.drop_index('uq_users_username_lower', table_name='users')
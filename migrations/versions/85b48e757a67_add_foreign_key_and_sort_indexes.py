@@ -0,0 +1,36 @@
+"""Add foreign key and sort order indexes
+
+Revision ID: 85b48e757a67
+Revises: 8dca524d17eb
+Create Date: 2026-10-17 10:03:18.274915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '85b48e757a67'
+down_revision = '8dca524d17eb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # likes.user_id and favorites.user_id are already served by the leading
+    # column of the (user_id, recipe_id) unique constraints.
+    op.create_index('ix_recipes_user_id', 'recipes', ['user_id'], unique=False)
+    op.create_index('ix_recipes_created_at_id', 'recipes', ['created_at', 'id'], unique=False)
+    op.create_index('ix_comments_recipe_id_created_at', 'comments', ['recipe_id', 'created_at'], unique=False)
+    op.create_index('ix_likes_recipe_id', 'likes', ['recipe_id'], unique=False)
+    op.create_index('ix_favorites_recipe_id', 'favorites', ['recipe_id'], unique=False)
+    op.create_index('ix_notifications_user_id_created_at', 'notifications', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_id_created_at', table_name='notifications')
+    op.drop_index('ix_favorites_recipe_id', table_name='favorites')
+    op.drop_index('ix_likes_recipe_id', table_name='likes')
+    op.drop_index('ix_comments_recipe_id_created_at', table_name='comments')
+    op.drop_index('ix_recipes_created_at_id', table_name='recipes')
+    op.drop_index('ix_recipes_user_id', table_name='recipes')
@@ -0,0 +1,28 @@
+"""Add partial index over unread notifications
+
+Revision ID: 8b41b15d50dc
+Revises: 85b48e757a67
+Create Date: 2026-10-17 11:41:06.730218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41b15d50dc'
+down_revision = '85b48e757a67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE notifications SET read_status = false WHERE read_status IS NULL")
+    op.create_index(
+        'ix_notifications_user_id_unread', 'notifications', ['user_id'], unique=False,
+        sqlite_where=sa.text('read_status = 0'), postgresql_where=sa.text('read_status = false')
+    )
+
+
+def downgrade():
+    op.drop_index('ix_notifications_user_id_unread', table_name='notifications')
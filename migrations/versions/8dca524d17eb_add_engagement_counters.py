@@ -0,0 +1,53 @@
+"""Add engagement counters to recipes and users
+
+Revision ID: 8dca524d17eb
+Revises: 224bc230bdcd
+Create Date: 2026-10-17 09:12:40.512307
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8dca524d17eb'
+down_revision = '224bc230bdcd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('likes_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('favorites_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comments_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('recipe_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('likes_received', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute("""
+        UPDATE recipes SET
+            likes_count = (SELECT COUNT(*) FROM likes WHERE likes.recipe_id = recipes.id),
+            favorites_count = (SELECT COUNT(*) FROM favorites WHERE favorites.recipe_id = recipes.id),
+            comments_count = (SELECT COUNT(*) FROM comments WHERE comments.recipe_id = recipes.id)
+    """)
+    op.execute("""
+        UPDATE users SET
+            recipe_count = (SELECT COUNT(*) FROM recipes WHERE recipes.user_id = users.id),
+            likes_received = (
+                SELECT COUNT(*) FROM likes JOIN recipes ON likes.recipe_id = recipes.id
+                WHERE recipes.user_id = users.id
+            )
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('likes_received')
+        batch_op.drop_column('recipe_count')
+
+    with op.batch_alter_table('recipes', schema=None) as batch_op:
+        batch_op.drop_column('comments_count')
+        batch_op.drop_column('favorites_count')
+        batch_op.drop_column('likes_count')
@@ -1,9 +1,22 @@
 from sqlalchemy_serializer import SerializerMixin
 from sqlalchemy.orm import validates
-from config import db, bcrypt
+from config import db
+from passwords import password_hasher, needs_rehash, HasherBusy
 from sqlalchemy.ext.hybrid import hybrid_property
 import re
 
+
+def duplicate_field(error):
+    """Which unique user column an IntegrityError tripped, if any.
+
+    SQLite and PostgreSQL both name the column or index in the message.
+    """
+    message = str(getattr(error, 'orig', error)).lower()
+    for field in ('email', 'username'):
+        if field in message:
+            return field
+    return None
+
 class User(db.Model, SerializerMixin):
     __tablename__ = 'users'
 
@@ -14,6 +27,18 @@ class User(db.Model, SerializerMixin):
     bio = db.Column(db.Text)
     profile_picture = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    recipe_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    likes_received = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    unread_notifications = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Set when the username or picture changes. Views embed those, so their
+    # ETags include the newest value (see conditional.IDENTITY_VERSION).
+    updated_at = db.Column(db.DateTime, index=True)
+    # Bumped when the user's notifications change without a new one
+    # arriving: some are marked read or purged, or a recipe they name is
+    # renamed or deleted.
+    notifications_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     recipes = db.relationship('Recipe', back_populates='user', cascade='all, delete-orphan')
     comments = db.relationship('Comment', back_populates='user', cascade='all, delete-orphan')
@@ -40,28 +65,39 @@ class User(db.Model, SerializerMixin):
 
     @password_hash.setter
     def password_hash(self, password):
-        password_hash = bcrypt.generate_password_hash(password.encode('utf-8'))
-        self._password_hash = password_hash.decode('utf-8')
+        self._password_hash = password_hasher.hash(password)
 
     def authenticate(self, password):
-        return bcrypt.check_password_hash(self._password_hash, password.encode('utf-8'))
+        if not password_hasher.verify(self._password_hash, password):
+            return False
+        if needs_rehash(self._password_hash):
+            # BCRYPT_LOG_ROUNDS changed since this hash was made; the caller
+            # commits. Under load it can wait for the next login.
+            try:
+                self.password_hash = password
+            except HasherBusy:
+                pass
+        return True
 
     @validates('username')
     def validate_username(self, key, username):
         if not username or len(username) < 3:
             raise ValueError("Username must be at least 3 characters long")
-        if User.query.filter(User.username == username).first():
-            raise ValueError("Username already taken")
         return username
 
     @validates('email')
     def validate_email(self, key, email):
         if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', email):
             raise ValueError("Invalid email format")
-        if User.query.filter(User.email == email).first():
-            raise ValueError("Email already registered")
         return email
 
+    # Uniqueness is enforced here rather than with a SELECT per assignment:
+    # the flush raises IntegrityError, which duplicate_field() explains.
+    __table_args__ = (
+        db.Index('uq_users_username_lower', db.func.lower(username), unique=True),
+        db.Index('uq_users_email_lower', db.func.lower(email), unique=True),
+    )
+
     def __repr__(self):
         return f'<User {self.username}>'
 
@@ -77,13 +113,23 @@ class Recipe(db.Model, SerializerMixin):
     image_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, server_default=db.func.now())
     updated_at = db.Column(db.DateTime, onupdate=db.func.now())
+    likes_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    favorites_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comments_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Time-decayed engagement, scaled to TrendingEpoch (see trending.py).
+    trending_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    weekly_score = db.Column(db.Float, nullable=False, default=0, server_default='0')
 
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
 
     user = db.relationship('User', back_populates='recipes')
     comments = db.relationship('Comment', back_populates='recipe', cascade='all, delete-orphan')
     likes = db.relationship('Like', back_populates='recipe', cascade='all, delete-orphan')
     favorites = db.relationship('Favorite', back_populates='recipe', cascade='all, delete-orphan')
+    ingredient_items = db.relationship(
+        'RecipeIngredient', back_populates='recipe', cascade='all, delete-orphan',
+        order_by='RecipeIngredient.position'
+    )
 
     serialize_rules = (
         '-user.recipes', 
@@ -100,7 +146,8 @@ class Recipe(db.Model, SerializerMixin):
         '-likes.user.likes',
         '-favorites.recipe',
         '-favorites.user.recipes',
-        '-favorites.user.favorites'
+        '-favorites.user.favorites',
+        '-ingredient_items'
     )
 
     @validates('title')
@@ -121,9 +168,63 @@ class Recipe(db.Model, SerializerMixin):
             raise ValueError(f"{key} must be at least 10 characters long")
         return content
 
+    __table_args__ = (
+        db.Index('ix_recipes_created_at_id', 'created_at', 'id'),
+        db.Index('ix_recipes_trending_score_id', 'trending_score', 'id'),
+        db.Index('ix_recipes_weekly_score_id', 'weekly_score', 'id'),
+    )
+
     def __repr__(self):
         return f'<Recipe {self.title}>'
 
+class RecipeIngredient(db.Model, SerializerMixin):
+    __tablename__ = 'recipe_ingredients'
+
+    id = db.Column(db.Integer, primary_key=True)
+    position = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Float)
+    unit = db.Column(db.String(20))
+    name = db.Column(db.String(100), nullable=False)
+    raw = db.Column(db.String(255), nullable=False)
+
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
+
+    recipe = db.relationship('Recipe', back_populates='ingredient_items')
+
+    serialize_rules = ('-recipe',)
+
+    # (name, recipe_id) doubles as the inverted index: one range scan yields
+    # an ingredient's posting list already sorted by recipe id.
+    __table_args__ = (db.Index('ix_recipe_ingredients_name_recipe_id', 'name', 'recipe_id'),)
+
+    def __repr__(self):
+        return f'<RecipeIngredient {self.name} in Recipe {self.recipe_id}>'
+
+class ImageVariant(db.Model, SerializerMixin):
+    __tablename__ = 'image_variants'
+
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(255), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    format = db.Column(db.String(10), nullable=False)
+    path = db.Column(db.String(255), nullable=False)
+    bytes = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    __table_args__ = (db.UniqueConstraint('source', 'format', 'size', name='unique_image_variant'),)
+
+    def __repr__(self):
+        return f'<ImageVariant {self.path}>'
+
+class TrendingEpoch(db.Model):
+    __tablename__ = 'trending_epochs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    epoch = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<TrendingEpoch {self.epoch}>'
+
 class Comment(db.Model, SerializerMixin):
     __tablename__ = 'comments'
 
@@ -139,6 +240,8 @@ class Comment(db.Model, SerializerMixin):
 
     serialize_rules = ('-user.comments', '-recipe.comments')
 
+    __table_args__ = (db.Index('ix_comments_recipe_id_created_at', 'recipe_id', 'created_at'),)
+
     @validates('content')
     def validate_content(self, key, content):
         if not content or len(content.strip()) < 1:
@@ -155,7 +258,7 @@ class Like(db.Model, SerializerMixin):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
 
     user = db.relationship('User', back_populates='likes')
     recipe = db.relationship('Recipe', back_populates='likes')
@@ -174,7 +277,7 @@ class Favorite(db.Model, SerializerMixin):
     created_at = db.Column(db.DateTime, server_default=db.func.now())
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
 
     user = db.relationship('User', back_populates='favorites')
     recipe = db.relationship('Recipe', back_populates='favorites')
@@ -186,6 +289,46 @@ class Favorite(db.Model, SerializerMixin):
     def __repr__(self):
         return f'<Favorite User {self.user_id} -> Recipe {self.recipe_id}>'
 
+class Follow(db.Model, SerializerMixin):
+    __tablename__ = 'follows'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, server_default=db.func.now())
+
+    follower_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    followed_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+
+    follower = db.relationship('User', foreign_keys=[follower_id])
+    followed = db.relationship('User', foreign_keys=[followed_id])
+
+    serialize_rules = ('-follower', '-followed')
+
+    __table_args__ = (db.UniqueConstraint('follower_id', 'followed_id', name='unique_follower_followed'),)
+
+    def __repr__(self):
+        return f'<Follow User {self.follower_id} -> User {self.followed_id}>'
+
+class TimelineEntry(db.Model):
+    """A recipe in a follower's home timeline, written when it is posted
+    (see timeline.py). ``created_at`` is copied from the recipe so a page is
+    one range scan of the (user_id, created_at, recipe_id) index."""
+    __tablename__ = 'timeline_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=False, index=True)
+    author_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'recipe_id', name='unique_timeline_user_recipe'),
+        db.Index('ix_timeline_entries_user_id_created_at_recipe_id', 'user_id', 'created_at', 'recipe_id'),
+        db.Index('ix_timeline_entries_user_id_author_id', 'user_id', 'author_id'),
+    )
+
+    def __repr__(self):
+        return f'<TimelineEntry Recipe {self.recipe_id} for User {self.user_id}>'
+
 class Notification(db.Model, SerializerMixin):
     __tablename__ = 'notifications'
 
@@ -193,10 +336,13 @@ class Notification(db.Model, SerializerMixin):
     type = db.Column(db.String(20), nullable=False)
     read_status = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, server_default=db.func.now())
+    # Likes flushed together are folded into one notification:
+    # "actor and ``others_count`` others liked your recipe".
+    others_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     actor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=True)
+    recipe_id = db.Column(db.Integer, db.ForeignKey('recipes.id'), nullable=True, index=True)
 
     user = db.relationship('User', foreign_keys=[user_id], back_populates='notifications')
     actor = db.relationship('User', foreign_keys=[actor_id], back_populates='actor_notifications')
@@ -204,6 +350,16 @@ class Notification(db.Model, SerializerMixin):
 
     serialize_rules = ('-user.notifications', '-actor.actor_notifications', '-recipe.notifications')
 
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_created_at', 'user_id', 'created_at'),
+        # max(id) per user for the ETag is a seek on this one.
+        db.Index('ix_notifications_user_id_id', 'user_id', 'id'),
+        db.Index(
+            'ix_notifications_user_id_unread', 'user_id',
+            sqlite_where=db.text('read_status = 0'), postgresql_where=db.text('read_status = false')
+        ),
+    )
+
     @validates('type')
     def validate_type(self, key, type):
         valid_types = ['like', 'comment', 'follow', 'comment_deleted']
@@ -0,0 +1,128 @@
+import json
+import queue
+from datetime import datetime, timedelta
+
+import click
+
+from broker import broker
+from config import app, db
+from counters import bump_user_counters
+from models import User, Notification, Recipe
+from serializers import Actor, NOTIFICATION_WITH_ACTOR
+
+
+def unread_filter(user_id):
+    # Must match the partial index predicate for the planner to use it.
+    return (Notification.user_id == user_id) & (Notification.read_status == False)
+
+
+def unread_count(user_id):
+    return db.session.query(User.unread_notifications).filter(User.id == user_id).scalar() or 0
+
+
+def notify(**fields):
+    """Add a notification and count it as unread. The caller commits."""
+    notification = Notification(**fields)
+    db.session.add(notification)
+    bump_user_counters(notification.user_id, unread_notifications=1)
+    return notification
+
+
+def mark_read(user_id, up_to_id=None, notification_id=None):
+    query = Notification.query.filter(unread_filter(user_id))
+    if up_to_id is not None:
+        query = query.filter(Notification.id <= up_to_id)
+    if notification_id is not None:
+        query = query.filter(Notification.id == notification_id)
+    updated = query.update({Notification.read_status: True}, synchronize_session=False)
+    bump_user_counters(user_id, unread_notifications=-updated, notifications_version=1 if updated else 0)
+    return updated
+
+
+def purge_read_notifications(user_id=None, older_than_days=None):
+    if older_than_days is None:
+        older_than_days = app.config['NOTIFICATION_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    query = Notification.query.filter(Notification.read_status == True, Notification.created_at < cutoff)
+    if user_id is not None:
+        query = query.filter(Notification.user_id == user_id)
+    User.query.filter(User.id.in_(query.with_entities(Notification.user_id))).update(
+        {User.notifications_version: User.notifications_version + 1}, synchronize_session=False
+    )
+    return query.delete(synchronize_session=False)
+
+
+def touch_notifications(recipe_id):
+    """Bump the notification version of everyone with a notification that
+    shows this recipe, after its title changed or it was deleted."""
+    recipients = db.session.query(Notification.user_id).filter(Notification.recipe_id == recipe_id)
+    return User.query.filter(User.id.in_(recipients)).update(
+        {User.notifications_version: User.notifications_version + 1}, synchronize_session=False
+    )
+
+
+def notification_rows():
+    return NOTIFICATION_WITH_ACTOR.query().join(Actor, Notification.actor_id == Actor.id).outerjoin(
+        Recipe, Notification.recipe_id == Recipe.id
+    )
+
+
+def publish_notification(notification):
+    row = notification_rows().filter(Notification.id == notification.id).first()
+    if row is not None:
+        broker.publish(notification.user_id, NOTIFICATION_WITH_ACTOR.dump(row))
+
+
+def _sse_event(notification):
+    return f"id: {notification['id']}\nevent: notification\ndata: {json.dumps(notification)}\n\n"
+
+
+def stream_notifications(user_id, last_event_id=None):
+    """Yield server-sent events for ``user_id``: first everything after
+    ``last_event_id`` from the database, then live events from the broker.
+
+    Must run inside ``stream_with_context``. The subscription is opened
+    before the catch-up query, so an event published in between is not lost;
+    ids already sent are skipped.
+    """
+    keepalive = app.config['SSE_KEEPALIVE_SECONDS']
+    with broker.subscribe(user_id) as inbox:
+        yield f"retry: {app.config['SSE_RETRY_MS']}\n\n"
+
+        last_sent = last_event_id or 0
+        if last_event_id is not None:
+            # Replay page by page until caught up, so a client that was
+            # away for long misses nothing.
+            page_size = app.config['SSE_REPLAY_PAGE_SIZE']
+            while True:
+                missed = notification_rows().filter(
+                    Notification.user_id == user_id, Notification.id > last_sent
+                ).order_by(Notification.id).limit(page_size).all()
+                for row in missed:
+                    notification = NOTIFICATION_WITH_ACTOR.dump(row)
+                    last_sent = notification['id']
+                    yield _sse_event(notification)
+                if len(missed) < page_size:
+                    break
+        # Give the connection back; the rest of the stream only waits on the inbox.
+        db.session.remove()
+
+        while True:
+            try:
+                notification = inbox.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            if notification['id'] <= last_sent:
+                continue
+            last_sent = notification['id']
+            yield _sse_event(notification)
+
+
+@app.cli.command('compact-notifications')
+@click.option('--days', type=int, default=None, help='Keep read notifications newer than this many days.')
+def compact_notifications_command(days):
+    """Delete read notifications older than the retention window."""
+    deleted = purge_read_notifications(older_than_days=days)
+    db.session.commit()
+    print(f"Deleted {deleted} read notifications.")
@@ -0,0 +1,102 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import String, and_, literal, or_
+
+from config import db
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be a positive integer")
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
+
+
+def encode_cursor(created_at, id):
+    raw = f'{created_at.isoformat()}|{id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        created_at, id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def encode_offset(offset):
+    return base64.urlsafe_b64encode(f'offset|{offset}'.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_offset(cursor):
+    """Cursor for result lists ordered by a score rather than a column, where
+    a keyset cannot be built."""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        prefix, offset = raw.split('|')
+        offset = int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if prefix != 'offset' or offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def timestamp_param(value):
+    # SQLite keeps CURRENT_TIMESTAMP defaults as text without microseconds, so
+    # the bound value must use the same format for equality to hold.
+    if db.engine.dialect.name == 'sqlite' and not value.microsecond:
+        return literal(value.strftime('%Y-%m-%d %H:%M:%S'), String)
+    return value
+
+
+def newer_than(query, created_col, id_col, cursor):
+    """Restrict ``query`` to rows after ``cursor`` in ``(created_col, id_col)``
+    order, for clients refreshing a list they already have."""
+    created_at, last_id = decode_cursor(cursor)
+    created_at = timestamp_param(created_at)
+    return query.filter(or_(
+        created_col > created_at,
+        and_(created_col == created_at, id_col > last_id)
+    ))
+
+
+def keyset_page(query, created_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE, key=None):
+    """Return one newest-first page of ``query`` and the cursor for the next.
+
+    Rows are ordered by ``(created_col, id_col)`` descending and the cursor
+    encodes the last row's pair, so each page is an index range scan no
+    matter how deep the client has paged.
+    """
+    if key is None:
+        key = lambda row: (getattr(row, created_col.key), getattr(row, id_col.key))
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        created_at = timestamp_param(created_at)
+        query = query.filter(or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < last_id)
+        ))
+
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return rows, next_cursor
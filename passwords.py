@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from config import app, bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised instead of queueing when every hashing slot is taken."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a fixed pool of threads.
+
+    At most ``workers`` hashes run at once and at most ``queue_size`` more
+    wait; anything beyond that fails immediately with ``HasherBusy`` so a
+    login flood costs a bounded amount of CPU and never parks every request
+    thread behind bcrypt. bcrypt releases the GIL, so the rest of the
+    worker keeps serving other endpoints meanwhile.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _run(self, func, *args):
+        if not self.slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(bcrypt.generate_password_hash, password.encode('utf-8')).decode('utf-8')
+
+    def verify(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password.encode('utf-8'))
+
+
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_QUEUE'])
+
+_dummy_hash = None
+
+
+def verify_unknown_user(password):
+    """Spend the same bcrypt time as a real check, so response timing does
+    not reveal which usernames exist."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = password_hasher.hash('not-a-real-password')
+    password_hasher.verify(_dummy_hash, password)
+    return False
+
+
+def needs_rehash(password_hash):
+    # bcrypt hashes look like $2b$<rounds>$<salt+digest>.
+    return int(password_hash.split('$')[2]) != app.config['BCRYPT_LOG_ROUNDS']
@@ -0,0 +1,187 @@
+from collections import defaultdict
+
+from sqlalchemy import delete, insert, literal, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from config import db
+from counters import bump_user_counters
+from models import Recipe, Like, Favorite
+from trending import engagement, score_terms
+
+# Liking a recipe also favorites it; unliking or unfavoriting removes both.
+# Every function returns ``(changed, counts)``. ``counts`` is a row of
+# (user_id, likes_count, favorites_count) for the recipe, or ``None`` when
+# it does not exist, and the caller commits or rolls back. Repeating a call
+# that already took effect costs the one statement that finds nothing to do
+# plus a primary key read of the counters. Trending scores change in the
+# same UPDATE as the counters.
+
+_ON_CONFLICT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _insert(model, user_id, recipe_id):
+    """Add the row unless it exists. Returns the new (id, created_at), or
+    ``None`` when it already existed."""
+    values = {'user_id': user_id, 'recipe_id': recipe_id}
+    columns = (model.id, model.created_at)
+    dialect = db.session.get_bind().dialect
+    on_conflict_insert = _ON_CONFLICT_INSERTS.get(dialect.name)
+    if on_conflict_insert and dialect.insert_returning:
+        statement = on_conflict_insert(model).values(**values).on_conflict_do_nothing()
+        return db.session.execute(statement.returning(*columns)).first()
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(model).values(**values))
+    except IntegrityError:
+        return None
+    return db.session.execute(select(*columns).where(model.user_id == user_id, model.recipe_id == recipe_id)).first()
+
+
+def _delete(model, user_id, recipe_id):
+    """Remove the row if it exists. Returns its (id, created_at), which the
+    trending scores need to take it back out, or ``None``."""
+    condition = (model.user_id == user_id) & (model.recipe_id == recipe_id)
+    if db.session.get_bind().dialect.delete_returning:
+        return db.session.execute(delete(model).where(condition).returning(model.id, model.created_at)).first()
+    row = db.session.execute(select(model.id, model.created_at).where(condition)).first()
+    if row:
+        db.session.execute(delete(model).where(model.id == row.id))
+    return row
+
+
+def _engagement(kind, row, removed=False):
+    # Scores use the stored created_at, so a removal subtracts exactly what
+    # the insert added.
+    if row is None or row.created_at is None:
+        return []
+    return [engagement(kind, row.created_at, removed=removed)]
+
+
+def _counts(recipe_id, likes=0, favorites=0, events=()):
+    """Apply the deltas to the recipe's counters and trending scores and
+    return the new counter values."""
+    columns = (Recipe.user_id, Recipe.likes_count, Recipe.favorites_count)
+    current = select(*columns).where(Recipe.id == recipe_id)
+    if not likes and not favorites and not events:
+        return db.session.execute(current).first()
+    statement = update(Recipe).where(Recipe.id == recipe_id).values({
+        Recipe.likes_count: Recipe.likes_count + likes,
+        Recipe.favorites_count: Recipe.favorites_count + favorites,
+        **score_terms(events)
+    })
+    if not db.session.get_bind().dialect.update_returning:
+        db.session.execute(statement)
+        return db.session.execute(current).first()
+    return db.session.execute(statement.returning(*columns)).first()
+
+
+def like_recipe(user_id, recipe_id):
+    added_like = _insert(Like, user_id, recipe_id)
+    if not added_like:
+        return False, _counts(recipe_id)
+    added_favorite = _insert(Favorite, user_id, recipe_id)
+    counts = _counts(
+        recipe_id, likes=1, favorites=int(added_favorite is not None),
+        events=_engagement('like', added_like) + _engagement('favorite', added_favorite)
+    )
+    if counts:
+        bump_user_counters(counts.user_id, likes_received=1)
+    return True, counts
+
+
+def unlike_recipe(user_id, recipe_id):
+    removed_like = _delete(Like, user_id, recipe_id)
+    if not removed_like:
+        return False, _counts(recipe_id)
+    removed_favorite = _delete(Favorite, user_id, recipe_id)
+    counts = _counts(
+        recipe_id, likes=-1, favorites=-int(removed_favorite is not None),
+        events=_engagement('like', removed_like, True) + _engagement('favorite', removed_favorite, True)
+    )
+    if counts:
+        bump_user_counters(counts.user_id, likes_received=-1)
+    return True, counts
+
+
+def apply_likes(changes):
+    """Apply a batch of likes and unlikes in the current transaction.
+
+    ``changes`` maps ``(user_id, recipe_id)`` to ``True`` for a like and
+    ``False`` for an unlike; changes to missing recipes are dropped. Counter
+    updates are summed, so each recipe and owner is updated once. Returns
+    ``{recipe_id: (owner_id, [new likers])}`` for every recipe that changed.
+    """
+    recipe_ids = {recipe_id for _, recipe_id in changes}
+    existing = {id for id, in db.session.execute(select(Recipe.id).where(Recipe.id.in_(recipe_ids)))}
+    deltas = defaultdict(lambda: [0, 0, []])
+    likers = defaultdict(list)
+    for (user_id, recipe_id), liked in changes.items():
+        if recipe_id not in existing:
+            continue
+        delta = deltas[recipe_id]
+        if liked:
+            like = _insert(Like, user_id, recipe_id)
+            if like:
+                favorite = _insert(Favorite, user_id, recipe_id)
+                delta[0] += 1
+                delta[1] += int(favorite is not None)
+                delta[2].extend(_engagement('like', like) + _engagement('favorite', favorite))
+                likers[recipe_id].append(user_id)
+        else:
+            like = _delete(Like, user_id, recipe_id)
+            if like:
+                favorite = _delete(Favorite, user_id, recipe_id)
+                delta[0] -= 1
+                delta[1] -= int(favorite is not None)
+                delta[2].extend(_engagement('like', like, True) + _engagement('favorite', favorite, True))
+
+    changed = {}
+    received = defaultdict(int)
+    for recipe_id, (likes, favorites, events) in deltas.items():
+        if not (likes or favorites or events):
+            continue
+        owner_id = _counts(recipe_id, likes=likes, favorites=favorites, events=events).user_id
+        received[owner_id] += likes
+        changed[recipe_id] = (owner_id, likers[recipe_id])
+    for owner_id, likes in received.items():
+        bump_user_counters(owner_id, likes_received=likes)
+    return changed
+
+
+def favorite_recipe(user_id, recipe_id):
+    added_favorite = _insert(Favorite, user_id, recipe_id)
+    if not added_favorite:
+        return False, _counts(recipe_id)
+    return True, _counts(recipe_id, favorites=1, events=_engagement('favorite', added_favorite))
+
+
+def unfavorite_recipe(user_id, recipe_id):
+    removed_favorite = _delete(Favorite, user_id, recipe_id)
+    if not removed_favorite:
+        return False, _counts(recipe_id)
+    removed_like = _delete(Like, user_id, recipe_id)
+    counts = _counts(
+        recipe_id, likes=-int(removed_like is not None), favorites=-1,
+        events=_engagement('favorite', removed_favorite, True) + _engagement('like', removed_like, True)
+    )
+    if counts and removed_like:
+        bump_user_counters(counts.user_id, likes_received=-1)
+    return True, counts
+
+
+def interactions(user_id, recipe_ids):
+    """Which of ``recipe_ids`` the user has liked and favorited, in one
+    statement. Both halves are probes of the unique (user_id, recipe_id)
+    indexes, so the cost depends on the number of ids asked about and not
+    on how many likes the user or the recipes have."""
+    statement = union_all(
+        select(literal('liked'), Like.recipe_id).where(Like.user_id == user_id, Like.recipe_id.in_(recipe_ids)),
+        select(literal('favorited'), Favorite.recipe_id).where(
+            Favorite.user_id == user_id, Favorite.recipe_id.in_(recipe_ids)
+        )
+    )
+    result = {'liked': [], 'favorited': []}
+    for kind, recipe_id in db.session.execute(statement):
+        result[kind].append(recipe_id)
+    return {kind: sorted(ids) for kind, ids in result.items()}
@@ -0,0 +1,102 @@
+import itertools
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.exc import DatabaseError, InterfaceError
+
+logger = logging.getLogger('grab_a_grub.replicas')
+
+REPLICA_BIND_PREFIX = 'replica-'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+def replica_binds(uris):
+    """``SQLALCHEMY_BINDS`` entries for the comma separated replica URIs.
+    Only ``RoutingSession`` uses these binds; no model is mapped to them."""
+    return {f'{REPLICA_BIND_PREFIX}{i}': uri.strip() for i, uri in enumerate(uris.split(',')) if uri.strip()}
+
+
+class RoutingSession(Session):
+    """Sends the reads of a ``read_replica`` view to the replica chosen for
+    the request. Flushes and INSERT/UPDATE/DELETE statements always go to
+    the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+    """Round-robin over the configured replicas, skipping any that failed
+    in the last ``REPLICA_RETRY_SECONDS``."""
+
+    def __init__(self, app=None, db=None):
+        self.keys = []
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.db = db
+        self.sticky_seconds = app.config['REPLICA_STICKY_SECONDS']
+        self.retry_seconds = app.config['REPLICA_RETRY_SECONDS']
+        self.keys = [key for key in app.config.get('SQLALCHEMY_BINDS', {}) if key.startswith(REPLICA_BIND_PREFIX)]
+        self._down_until = {}
+        self._next = itertools.cycle(range(len(self.keys))) if self.keys else None
+        self._lock = threading.Lock()
+        app.after_request(self._remember_write)
+
+    def _remember_write(self, response):
+        # Read-your-writes: the client's next reads stay on the primary
+        # until replicas have had time to catch up.
+        if self.keys and request.method in WRITE_METHODS and response.status_code < 400:
+            session['db_write_at'] = time.time()
+        return response
+
+    def choose(self):
+        """An available replica engine for this request, or ``None`` to use
+        the primary."""
+        if not self.keys or time.time() - session.get('db_write_at', 0) < self.sticky_seconds:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in self.keys:
+                key = self.keys[next(self._next)]
+                if self._down_until.get(key, 0) <= now:
+                    return self.db.engines[key]
+        return None
+
+    def mark_down(self, engine):
+        for key in self.keys:
+            if self.db.engines[key] is engine:
+                self._down_until[key] = time.monotonic() + self.retry_seconds
+                logger.warning('Replica %s failed, using the primary for %ss', key, self.retry_seconds)
+
+
+replicas = ReplicaSet()
+
+
+def read_replica(func):
+    """Run a read-only view against a replica, retrying it on the primary if
+    the replica fails."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.db_replica = replicas.choose()
+        if g.db_replica is None:
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        except (DatabaseError, InterfaceError):
+            replicas.db.session.rollback()
+            replicas.mark_down(g.db_replica)
+            g.db_replica = None
+            return func(*args, **kwargs)
+        finally:
+            g.db_replica = None
+    return wrapper
@@ -0,0 +1,253 @@
+import bisect
+import math
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import Float, Integer, func, inspect, or_, text
+
+from config import app, db
+from models import Recipe
+from pagination import timestamp_param
+
+FTS_TABLE = 'recipes_fts'
+
+# Relative weight of a match in each indexed column, shared by both backends.
+FIELD_WEIGHTS = (('title', 3.0), ('description', 1.0), ('ingredients', 1.5))
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokenize(value):
+    return _TOKEN.findall(value.lower()) if value else []
+
+
+def fts5_available(connection):
+    if connection.dialect.name != 'sqlite':
+        return False
+    options = {row[0] for row in connection.exec_driver_sql('PRAGMA compile_options')}
+    return 'ENABLE_FTS5' in options
+
+
+def create_fts_table(connection):
+    columns = ', '.join(name for name, _ in FIELD_WEIGHTS)
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5({columns}, tokenize='unicode61')"
+    )
+
+
+def _documents(query):
+    return query.with_entities(Recipe.id, *[getattr(Recipe, name) for name, _ in FIELD_WEIGHTS])
+
+
+class FTS5Index:
+    """Search through an SQLite FTS5 table keyed by recipe id. Writes go
+    through the caller's session so the index commits with the recipe."""
+
+    def add(self, recipe):
+        self.remove(recipe.id)
+        columns = [name for name, _ in FIELD_WEIGHTS]
+        db.session.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(columns)}) VALUES (:id, :{', :'.join(columns)})"),
+            {'id': recipe.id, **{name: getattr(recipe, name) or '' for name in columns}}
+        )
+
+    def remove(self, recipe_id):
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :id"), {'id': recipe_id})
+
+    def rebuild(self):
+        db.session.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        for recipe in _documents(Recipe.query).yield_per(500):
+            self.add(recipe)
+
+    def search(self, query, tokens, offset, limit):
+        # Every term must match; each is a prefix so partial words still hit.
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        weights = ', '.join(str(weight) for _, weight in FIELD_WEIGHTS)
+        hits = text(
+            f"SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS score "
+            f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=match).columns(id=Integer, score=Float).subquery('hits')
+        # bm25() is lower-is-better.
+        return query.join(hits, hits.c.id == Recipe.id).order_by(
+            hits.c.score, Recipe.id
+        ).offset(offset).limit(limit + 1).all()
+
+
+class MemoryIndex:
+    """Pure-Python inverted index with BM25F scoring, for databases without
+    FTS5. Each worker holds its own copy; before searching it catches up
+    with rows other workers added or edited, and rebuilds if any were
+    deleted. Request threads share the copy, so every read and write of it
+    holds ``_lock``."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.vocabulary = []
+        self.lengths = {}
+        self.terms = {}
+        self.state = None
+        # Reentrant: search syncs first, and sync may rebuild.
+        self._lock = threading.RLock()
+
+    def add(self, recipe):
+        with self._lock:
+            self._add(recipe)
+
+    def _add(self, recipe):
+        self._remove(recipe.id)
+        frequencies = defaultdict(float)
+        for name, weight in FIELD_WEIGHTS:
+            for token in tokenize(getattr(recipe, name)):
+                frequencies[token] += weight
+        for token, frequency in frequencies.items():
+            if token not in self.postings:
+                bisect.insort(self.vocabulary, token)
+            self.postings[token][recipe.id] = frequency
+        self.lengths[recipe.id] = sum(frequencies.values())
+        self.terms[recipe.id] = list(frequencies)
+
+    def remove(self, recipe_id):
+        with self._lock:
+            self._remove(recipe_id)
+
+    def _remove(self, recipe_id):
+        self.lengths.pop(recipe_id, None)
+        for token in self.terms.pop(recipe_id, ()):
+            del self.postings[token][recipe_id]
+            if not self.postings[token]:
+                del self.postings[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+
+    def rebuild(self):
+        with self._lock:
+            self.postings.clear()
+            self.vocabulary.clear()
+            self.lengths.clear()
+            self.terms.clear()
+            for recipe in _documents(Recipe.query).yield_per(500):
+                self._add(recipe)
+            self.state = self._current_state()
+
+    def _current_state(self):
+        return db.session.query(func.count(Recipe.id), func.max(Recipe.id), func.max(Recipe.updated_at)).one()
+
+    def sync(self):
+        with self._lock:
+            state = self._current_state()
+            if self.state is None:
+                return self.rebuild()
+            if tuple(state) == tuple(self.state):
+                return
+            _, max_id, max_updated = self.state
+            changed = Recipe.query.filter(or_(
+                Recipe.id > (max_id or 0),
+                Recipe.updated_at >= timestamp_param(max_updated) if max_updated else Recipe.updated_at.isnot(None)
+            ))
+            for recipe in _documents(changed):
+                self._add(recipe)
+            if len(self.lengths) != state[0]:
+                return self.rebuild()
+            self.state = state
+
+    def _expand(self, token):
+        start = bisect.bisect_left(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + '\uffff')
+        return self.vocabulary[start:end]
+
+    def rank(self, tokens):
+        with self._lock:
+            return self._rank(tokens)
+
+    def _rank(self, tokens):
+        total = len(self.lengths)
+        if not total:
+            return []
+        average_length = sum(self.lengths.values()) / total
+        scores = None
+        for token in tokens:
+            token_scores = defaultdict(float)
+            for term in self._expand(token):
+                docs = self.postings[term]
+                idf = math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+                for recipe_id, frequency in docs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[recipe_id] / average_length)
+                    token_scores[recipe_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {recipe_id: score + token_scores[recipe_id]
+                          for recipe_id, score in scores.items() if recipe_id in token_scores}
+        return sorted(scores.items(), key=lambda hit: (-hit[1], hit[0]))
+
+    def search(self, query, tokens, offset, limit):
+        with self._lock:
+            self.sync()
+            ranked = [recipe_id for recipe_id, _ in self._rank(tokens)]
+        # Filters live in SQL, so walk the ranking in chunks until the page is full.
+        page = []
+        for start in range(0, len(ranked), 500):
+            chunk = ranked[start:start + 500]
+            allowed = {row.id for row in query.with_entities(Recipe.id).filter(Recipe.id.in_(chunk))}
+            page.extend(recipe_id for recipe_id in chunk if recipe_id in allowed)
+            if len(page) > offset + limit:
+                break
+        page = page[offset:offset + limit + 1]
+        if not page:
+            return []
+        rows = {row.id: row for row in query.filter(Recipe.id.in_(page))}
+        return [rows[recipe_id] for recipe_id in page]
+
+
+_index = None
+
+
+def get_index():
+    """The configured index; ``auto`` picks FTS5 once its table exists."""
+    global _index
+    if _index is None:
+        backend = app.config['SEARCH_BACKEND']
+        if backend == 'auto':
+            with db.engine.connect() as connection:
+                use_fts = fts5_available(connection) and inspect(connection).has_table(FTS_TABLE)
+            backend = 'fts5' if use_fts else 'memory'
+        if backend == 'fts5':
+            _index = FTS5Index()
+        elif backend == 'memory':
+            _index = MemoryIndex()
+        else:
+            raise ValueError(f"Unknown SEARCH_BACKEND: {backend}")
+    return _index
+
+
+def index_recipe(recipe):
+    get_index().add(recipe)
+
+
+def unindex_recipe(recipe_id):
+    get_index().remove(recipe_id)
+
+
+def rebuild_search_index():
+    """Reindex every recipe, creating the FTS5 table first when the database
+    supports it (``db.create_all`` does not, as it is not a model table)."""
+    global _index
+    if app.config['SEARCH_BACKEND'] in ('auto', 'fts5'):
+        with db.engine.begin() as connection:
+            if fts5_available(connection):
+                create_fts_table(connection)
+        _index = None
+    index = get_index()
+    index.rebuild()
+    db.session.commit()
+    return index
+
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Reindex every recipe for /api/recipes/search."""
+    index = rebuild_search_index()
+    print(f"Rebuilt the search index ({type(index).__name__}).")
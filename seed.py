@@ -2,6 +2,9 @@
 
 from app import app, db
 from models import User, Recipe, Comment, Like, Favorite, Notification
+from counters import reconcile_counters
+from search import rebuild_search_index
+from ingredients import backfill_ingredients
 import random
 
 def seed_data():
@@ -169,6 +172,15 @@ def seed_data():
         db.session.commit()
         print(f"Created {len(notifications)} notifications")
         
+        print("Reconciling counters...")
+        reconcile_counters()
+        
+        print("Building search index...")
+        rebuild_search_index()
+        
+        print("Parsing ingredients...")
+        backfill_ingredients()
+        
         print("Seeding completed successfully!")
 
 if __name__ == '__main__':
@@ -0,0 +1,352 @@
+import hashlib
+import io
+import mimetypes
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import Response, request, send_from_directory
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import NotFound, RequestedRangeNotSatisfiable
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+
+from config import app, db
+from models import User, Recipe, ImageVariant
+
+CHUNK_SIZE = 64 * 1024
+VARIANTS_PREFIX = 'variants/'
+
+EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Blobs and the variants derived from them are named after their content hash.
+_CONTENT_ADDRESSED = re.compile(r'^(?:[0-9a-f]{2}/[0-9a-f]{2}/|variants/)(?P<digest>[0-9a-f]{64}(?:-\d+)?)\.\w+$')
+
+
+def blob_key(digest, extension):
+    # Two levels of sharding keep every directory small.
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{EXTENSION_ALIASES.get(extension, extension)}'
+
+
+def _content_type(key):
+    return mimetypes.guess_type(key)[0] or 'application/octet-stream'
+
+
+def _cache_for(response, max_age):
+    if max_age:
+        response.cache_control.public = True
+        response.cache_control.max_age = max_age
+        if max_age >= IMMUTABLE_MAX_AGE:
+            response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+
+def _hash_into(stream, out):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+        out.write(chunk)
+    return digest.hexdigest()
+
+
+class LocalStorage:
+    """Blobs on the local filesystem under ``root``."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def save(self, stream, extension):
+        """Copy ``stream`` to disk chunk by chunk while hashing it and file it
+        under its content hash. Returns ``(key, created)``; ``created`` is
+        false when an identical blob was already stored."""
+        os.makedirs(self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                digest = _hash_into(stream, out)
+            key = blob_key(digest, extension)
+            path = self._path(key)
+            if os.path.exists(path):
+                # Refresh the mtime so garbage collection's grace period
+                # covers the upload that is about to reference it.
+                os.utime(path)
+                return key, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            temp_path = None
+            return key, True
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
+
+    def put(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as out:
+            out.write(data)
+        os.replace(path + '.tmp', path)
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def list(self):
+        """Yield ``(key, last_modified)`` for every stored blob."""
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.startswith('.') or filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                yield key, datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+
+    def send(self, key, etag=None, max_age=None):
+        offload = app.config['UPLOADS_OFFLOAD']
+        if not offload:
+            # send_file answers If-None-Match/If-Modified-Since and Range itself.
+            response = send_from_directory(self.root, key, etag=etag or True, max_age=max_age)
+            _cache_for(response, max_age)
+            return response
+
+        path = safe_join(self.root, key)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        stat = os.stat(path)
+        response = Response(mimetype=_content_type(key))
+        response.set_etag(etag or f'{int(stat.st_mtime)}-{stat.st_size}')
+        response.last_modified = stat.st_mtime
+        _cache_for(response, max_age)
+        response = response.make_conditional(request.environ)
+        if response.status_code == 304:
+            return response
+        # The proxy streams the file and handles Range; the worker is free.
+        if offload == 'x-accel':
+            response.headers['X-Accel-Redirect'] = f"{app.config['UPLOADS_ACCEL_PREFIX'].rstrip('/')}/{key}"
+        elif offload == 'x-sendfile':
+            response.headers['X-Sendfile'] = os.path.abspath(path)
+        else:
+            raise ValueError(f"Unknown UPLOADS_OFFLOAD: {offload}")
+        return response
+
+
+class S3Storage:
+    """Blobs in an S3-compatible bucket, through a boto3-style client."""
+
+    def __init__(self, client, bucket, prefix=''):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def save(self, stream, extension):
+        # Spool so the hash, and therefore the key, is known before uploading.
+        with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as spool:
+            digest = _hash_into(stream, spool)
+            key = blob_key(digest, extension)
+            if self.exists(key):
+                return key, False
+            spool.seek(0)
+            self.client.put_object(
+                Bucket=self.bucket, Key=self.prefix + key, Body=spool,
+                ContentType=_content_type(key)
+            )
+        return key, True
+
+    def put(self, key, data):
+        self.client.put_object(
+            Bucket=self.bucket, Key=self.prefix + key, Body=data,
+            ContentType=_content_type(key)
+        )
+
+    def open(self, key):
+        return io.BytesIO(self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)['Body'].read())
+
+    def _stat(self, key):
+        listing = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self.prefix + key, MaxKeys=1)
+        for item in listing.get('Contents', []):
+            if item['Key'] == self.prefix + key:
+                return item
+        return None
+
+    def exists(self, key):
+        return self._stat(key) is not None
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def list(self):
+        kwargs = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        while True:
+            listing = self.client.list_objects_v2(**kwargs)
+            for item in listing.get('Contents', []):
+                yield item['Key'][len(self.prefix):], item['LastModified']
+            if not listing.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = listing['NextContinuationToken']
+
+    def send(self, key, etag=None, max_age=None):
+        item = self._stat(key)
+        if item is None:
+            raise NotFound()
+        size = item['Size']
+        etag = etag or item.get('ETag', '').strip('"') or f"{int(item['LastModified'].timestamp())}-{size}"
+
+        response = Response(mimetype=_content_type(key))
+        response.set_etag(etag)
+        response.last_modified = item['LastModified']
+        response.accept_ranges = 'bytes'
+        _cache_for(response, max_age)
+        if not is_resource_modified(request.environ, etag, last_modified=item['LastModified']):
+            response.status_code = 304
+            return response
+
+        # Fetch only the requested bytes rather than skipping through the object.
+        byte_range = None
+        if request.range and (request.if_range.etag is None or request.if_range.etag == etag):
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                raise RequestedRangeNotSatisfiable(length=size)
+        kwargs = {'Bucket': self.bucket, 'Key': self.prefix + key}
+        if byte_range:
+            kwargs['Range'] = f'bytes={byte_range[0]}-{byte_range[1] - 1}'
+            response.status_code = 206
+            response.content_range = ContentRange('bytes', byte_range[0], byte_range[1], size)
+        body = self.client.get_object(**kwargs)['Body']
+        response.response = iter(lambda: body.read(CHUNK_SIZE), b'')
+        response.content_length = byte_range[1] - byte_range[0] if byte_range else size
+        return response
+
+
+class LocalS3Client:
+    """Dict-backed stand-in for a boto3 S3 client, for development and tests."""
+
+    def __init__(self):
+        self._objects = {}
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        data = Body if isinstance(Body, bytes) else Body.read()
+        self._objects[(Bucket, Key)] = (data, ContentType, datetime.now(timezone.utc))
+
+    def get_object(self, Bucket, Key, Range=None):
+        data, content_type, modified = self._objects[(Bucket, Key)]
+        if Range:
+            start, end = Range[len('bytes='):].split('-')
+            data = data[int(start):int(end) + 1]
+        return {'Body': io.BytesIO(data), 'ContentType': content_type,
+                'ContentLength': len(data), 'LastModified': modified}
+
+    def delete_object(self, Bucket, Key):
+        self._objects.pop((Bucket, Key), None)
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(key for bucket, key in self._objects if bucket == Bucket and key.startswith(Prefix))
+        if ContinuationToken:
+            keys = [key for key in keys if key > ContinuationToken]
+        page = keys[:MaxKeys]
+        listing = {
+            'Contents': [{'Key': key, 'LastModified': self._objects[(Bucket, key)][2],
+                          'Size': len(self._objects[(Bucket, key)][0])} for key in page],
+            'IsTruncated': len(keys) > MaxKeys,
+        }
+        if listing['IsTruncated']:
+            listing['NextContinuationToken'] = page[-1]
+        return listing
+
+
+def create_storage(config):
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config['UPLOAD_FOLDER'])
+    if backend == 'local-s3':
+        return S3Storage(LocalS3Client(), 'uploads')
+    if backend == 's3':
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires the 'boto3' package")
+        client = boto3.client('s3', endpoint_url=config.get('STORAGE_S3_ENDPOINT_URL'))
+        return S3Storage(client, config['STORAGE_S3_BUCKET'], config.get('STORAGE_S3_PREFIX', ''))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage(app.config)
+
+
+def send_upload(key, max_age=None):
+    """Serve a stored upload. Content-addressed names never change, so they
+    are cached for a year as immutable, with their hash as the ETag."""
+    match = _CONTENT_ADDRESSED.match(key)
+    etag = match.group('digest') if match else None
+    if max_age is None:
+        max_age = IMMUTABLE_MAX_AGE if match else app.config['UPLOADS_MAX_AGE']
+    return storage.send(key, etag, max_age)
+
+
+def upload_url(key):
+    return f"{app.config['UPLOAD_URL_PREFIX']}/{key}"
+
+
+def key_from_url(url):
+    if url and '/uploads/' in url:
+        return url.split('/uploads/', 1)[1]
+    return None
+
+
+def referenced_keys():
+    keys = set()
+    for column in (User.profile_picture, Recipe.image_url):
+        for url, in db.session.query(column).filter(column.isnot(None)).yield_per(1000):
+            keys.add(key_from_url(url))
+    keys.discard(None)
+    return keys
+
+
+def collect_garbage(grace=timedelta(hours=1), dry_run=False):
+    """Delete blobs (and their image variants) that no user or recipe points
+    at. Blobs younger than ``grace`` are kept: their upload may not have
+    committed yet. Returns the deleted keys."""
+    cutoff = datetime.now(timezone.utc) - grace
+    referenced = referenced_keys()
+    garbage = [
+        key for key, modified in storage.list()
+        if not key.startswith(VARIANTS_PREFIX) and key not in referenced and modified < cutoff
+    ]
+    if dry_run or not garbage:
+        return garbage
+
+    # Anything referenced since the scan started survives.
+    garbage = [key for key in garbage if key not in referenced_keys()]
+    for key in garbage:
+        for path, in db.session.query(ImageVariant.path).filter(ImageVariant.source == key):
+            storage.delete(path)
+        ImageVariant.query.filter(ImageVariant.source == key).delete(synchronize_session=False)
+        storage.delete(key)
+    db.session.commit()
+    return garbage
+
+
+@app.cli.command('gc-uploads')
+@click.option('--grace-hours', type=float, default=1, show_default=True,
+              help='Keep unreferenced uploads younger than this.')
+@click.option('--dry-run', is_flag=True, help='List what would be deleted.')
+def gc_uploads_command(grace_hours, dry_run):
+    """Delete uploads no longer referenced by any user or recipe."""
+    garbage = collect_garbage(timedelta(hours=grace_hours), dry_run)
+    for key in garbage:
+        print(key)
+    print(f"{'Would delete' if dry_run else 'Deleted'} {len(garbage)} uploads.")
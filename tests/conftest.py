@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+# config.py reads the environment at import, so point it at scratch files
+# before anything imports the app: a primary, and one replica that only
+# changes when a test calls ``sync_replica``.
+DATA_DIR = tempfile.mkdtemp(prefix='grab-a-grub-tests-')
+PRIMARY = os.path.join(DATA_DIR, 'primary.db')
+REPLICA = os.path.join(DATA_DIR, 'replica.db')
+os.environ['DATABASE_URI'] = f'sqlite:///{PRIMARY}'
+os.environ['DATABASE_REPLICA_URIS'] = f'sqlite:///{REPLICA}'
+os.environ['WRITE_BEHIND_JOURNAL_DIR'] = os.path.join(DATA_DIR, 'write-behind')
+os.environ['BCRYPT_LOG_ROUNDS'] = '4'
+# As deployed on Render, behind one proxy.
+os.environ['TRUSTED_PROXY_HOPS'] = '1'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app as flask_app  # noqa: E402
+from cache import cache  # noqa: E402
+from config import db  # noqa: E402
+from replicas import replicas  # noqa: E402
+from throttle import login_throttle, create_counters  # noqa: E402
+
+
+def sync_replica():
+    """Copy the primary into the replica file, as replication would."""
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+@pytest.fixture
+def app():
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.remove()
+    sync_replica()
+    cache.clear()
+    replicas._down_until.clear()
+    login_throttle.counters = create_counters(cache)
+    yield flask_app
+    with flask_app.app_context():
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def signup(client, username):
+    response = client.post('/api/signup', json={
+        'username': username, 'email': f'{username}@example.com', 'password': 'password123'
+    })
+    assert response.status_code == 201, response.json
+    return response.json['id']
+
+
+def create_recipe(client, title='Lemon pasta'):
+    response = client.post('/api/recipes', json={
+        'title': title, 'ingredients': '200g pasta, 1 lemon, salt',
+        'instructions': 'Boil the pasta and toss with lemon.', 'cooking_time': 15
+    })
+    assert response.status_code == 201, response.json
+    return response.json['id']
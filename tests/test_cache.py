@@ -0,0 +1,117 @@
+from cache import cache, recipe_cache_keys, RECIPE_KEY
+from conftest import create_recipe, signup, sync_replica
+from config import db
+from models import Recipe
+
+
+def owner_recipes(client, owner_id):
+    response = client.get(f'/api/recipes/user/{owner_id}')
+    assert response.status_code == 200
+    return response.json
+
+
+def owner_recipe(client, owner_id):
+    return owner_recipes(client, owner_id)[0]
+
+
+def test_favorite_refreshes_the_owners_recipe_list(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    assert owner_recipe(alice, alice_id)['favorites_count'] == 0
+
+    assert bob.post('/api/favorites', json={'recipe_id': recipe_id}).status_code == 201
+    sync_replica()
+    assert owner_recipe(alice, alice_id)['favorites_count'] == 1
+
+    assert bob.delete('/api/favorites', json={'recipe_id': recipe_id}).status_code == 200
+    sync_replica()
+    assert owner_recipe(alice, alice_id)['favorites_count'] == 0
+
+
+def test_cached_detail_is_served_until_a_write_invalidates_it(app):
+    alice, reader = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice, 'Old title')
+    assert reader.get(f'/api/recipes/{recipe_id}').json['title'] == 'Old title'
+    assert cache.get(RECIPE_KEY.format(id=recipe_id)) is not None
+
+    # Behind the API's back, so nothing invalidates the entry.
+    with app.app_context():
+        Recipe.query.filter(Recipe.id == recipe_id).update({Recipe.title: 'Edited by hand'})
+        db.session.commit()
+    sync_replica()
+    assert reader.get(f'/api/recipes/{recipe_id}').json['title'] == 'Old title'
+    # A query string skips the cache.
+    assert reader.get(f'/api/recipes/{recipe_id}?include=likes').json['title'] == 'Edited by hand'
+
+    assert alice.patch(f'/api/recipes/{recipe_id}', json={'title': 'New title'}).status_code == 200
+    assert cache.get(RECIPE_KEY.format(id=recipe_id)) is None
+    assert reader.get(f'/api/recipes/{recipe_id}').json['title'] == 'New title'
+
+
+def test_comments_invalidate_the_thread_and_the_recipe(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    assert bob.get(f'/api/comments/recipe/{recipe_id}').json['comments'] == []
+    assert bob.get(f'/api/recipes/{recipe_id}').json['comments_count'] == 0
+
+    comment = bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).json
+    assert [c['id'] for c in bob.get(f'/api/comments/recipe/{recipe_id}').json['comments']] == [comment['id']]
+    assert bob.get(f'/api/recipes/{recipe_id}').json['comments_count'] == 1
+
+    assert bob.delete('/api/comments', json={'comment_id': comment['id']}).status_code == 204
+    assert bob.get(f'/api/comments/recipe/{recipe_id}').json['comments'] == []
+    assert bob.get(f'/api/recipes/{recipe_id}').json['comments_count'] == 0
+
+
+def test_recipe_cache_keys_cover_every_view_embedding_the_recipe(app):
+    alice, bob, carol = app.test_client(), app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id, carol_id = signup(bob, 'bob'), signup(carol, 'carol')
+    assert bob.post('/api/favorites', json={'recipe_id': recipe_id}).status_code == 201
+
+    with app.app_context():
+        keys = recipe_cache_keys(recipe_id, alice_id, carol_id)
+    assert keys == {
+        f'recipe:{recipe_id}', f'recipe_comments:{recipe_id}',
+        f'user_recipes:{alice_id}', f'user_profile:{alice_id}',
+        f'user_favorites:{carol_id}', f'user_favorites:{bob_id}',
+    }
+
+
+def test_deleting_a_recipe_clears_its_views(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id = signup(bob, 'bob')
+    assert bob.post('/api/favorites', json={'recipe_id': recipe_id}).status_code == 201
+    assert bob.get(f'/api/recipes/{recipe_id}').status_code == 200
+    assert len(bob.get(f'/api/favorites/user/{bob_id}').json) == 1
+    assert bob.get(f'/api/users/{alice_id}').json['recipe_count'] == 1
+
+    assert alice.delete(f'/api/recipes/{recipe_id}').status_code == 204
+    assert bob.get(f'/api/recipes/{recipe_id}').status_code == 404
+    assert bob.get(f'/api/favorites/user/{bob_id}').json == []
+    assert owner_recipes(bob, alice_id) == []
+    assert bob.get(f'/api/users/{alice_id}').json['recipe_count'] == 0
+
+
+def test_profile_edits_refresh_the_profile_and_embedded_authors(app):
+    alice = app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    assert alice.get(f'/api/users/{alice_id}').json['bio'] in (None, '')
+    assert alice.get(f'/api/recipes/{recipe_id}').json['user']['username'] == 'alice'
+
+    assert alice.patch(f'/api/users/{alice_id}', json={'bio': 'Home cook'}).status_code == 200
+    assert alice.get(f'/api/users/{alice_id}').json['bio'] == 'Home cook'
+    # Untouched: the recipe does not embed the bio.
+    assert cache.get(RECIPE_KEY.format(id=recipe_id)) is not None
+
+    assert alice.patch(f'/api/users/{alice_id}', json={'username': 'alicia'}).status_code == 200
+    assert alice.get(f'/api/recipes/{recipe_id}').json['user']['username'] == 'alicia'
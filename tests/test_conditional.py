@@ -0,0 +1,106 @@
+from conftest import create_recipe, signup, sync_replica
+
+
+def etag(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.json
+    return response.headers['ETag']
+
+
+def revalidate(client, url, tag):
+    return client.get(url, headers={'If-None-Match': tag}).status_code
+
+
+def test_renaming_an_author_changes_embedded_etags(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id = signup(bob, 'bob')
+    assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).status_code == 201
+    sync_replica()
+
+    urls = [
+        f'/api/recipes/{recipe_id}',
+        '/api/recipes?limit=10',
+        f'/api/comments/recipe/{recipe_id}',
+        f'/api/notifications/user/{alice_id}',
+    ]
+    before = {url: etag(alice, url) for url in urls}
+    assert all(revalidate(alice, url, tag) == 304 for url, tag in before.items())
+
+    # Bob's name is embedded as the commenter and the notification actor.
+    assert bob.patch(f'/api/users/{bob_id}', json={'username': 'robert'}).status_code == 200
+    sync_replica()
+
+    for url, tag in before.items():
+        assert revalidate(alice, url, tag) == 200, url
+        assert etag(alice, url) != tag, url
+
+
+def test_unchanged_profile_keeps_etags(app):
+    client = app.test_client()
+    user_id = signup(client, 'alice')
+    recipe_id = create_recipe(client)
+    sync_replica()
+    tag = etag(client, f'/api/recipes/{recipe_id}')
+
+    assert client.patch(f'/api/users/{user_id}', json={'username': 'alice'}).status_code == 200
+    sync_replica()
+    assert revalidate(client, f'/api/recipes/{recipe_id}', tag) == 304
+
+
+def test_editing_a_bio_keeps_other_users_etags(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id = signup(bob, 'bob')
+    sync_replica()
+    tag = etag(alice, f'/api/recipes/{recipe_id}')
+
+    assert bob.patch(f'/api/users/{bob_id}', json={'bio': 'Home cook', 'email': 'robert@example.com'}).status_code == 200
+    sync_replica()
+    assert revalidate(alice, f'/api/recipes/{recipe_id}', tag) == 304
+
+
+def test_retitling_a_recipe_changes_notification_etags(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice, 'Old title')
+    signup(bob, 'bob')
+    assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).status_code == 201
+    sync_replica()
+
+    url = f'/api/notifications/user/{alice_id}'
+    tag = etag(alice, url)
+    assert alice.get(url).json['notifications'][0]['recipe']['title'] == 'Old title'
+
+    assert alice.patch(f'/api/recipes/{recipe_id}', json={'title': 'New title'}).status_code == 200
+    sync_replica()
+    assert revalidate(alice, url, tag) == 200
+    assert alice.get(url).json['notifications'][0]['recipe']['title'] == 'New title'
+
+
+def test_reading_notifications_changes_their_etag(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).status_code == 201
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+
+    url = f'/api/notifications/user/{alice_id}'
+    page = alice.get(url)
+    assert page.json['unread_count'] == 2
+    newest = page.json['notifications'][0]['id']
+
+    assert alice.patch(f'/api/notifications/{newest}/mark_read').status_code == 200
+    assert revalidate(alice, url, page.headers['ETag']) == 200
+    assert alice.get(f'{url}/unread_count').json['unread_count'] == 1
+
+    tag = etag(alice, url)
+    # Marking it again changes nothing.
+    assert alice.patch(f'/api/notifications/{newest}/mark_read').status_code == 200
+    assert revalidate(alice, url, tag) == 304
+
+    assert alice.patch(f'{url}/mark_read', json={}).json == {'updated': 1, 'unread_count': 0}
+    assert revalidate(alice, url, tag) == 200
@@ -0,0 +1,82 @@
+from conftest import create_recipe, signup
+from config import db
+from counters import reconcile_counters, RECIPE_COUNTERS, USER_COUNTERS
+from models import Recipe, User
+
+
+def counts(app, model, id, names):
+    with app.app_context():
+        db.session.remove()
+        row = db.session.get(model, id)
+        return {name: getattr(row, name) for name in names}
+
+
+def recipe_counts(app, recipe_id):
+    return counts(app, Recipe, recipe_id, RECIPE_COUNTERS)
+
+
+def user_counts(app, user_id):
+    return counts(app, User, user_id, USER_COUNTERS)
+
+
+def test_engagement_keeps_recipe_and_user_counters(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    assert user_counts(app, alice_id)['recipe_count'] == 1
+
+    # A like also favorites the recipe.
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+    comment = bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).json
+    assert recipe_counts(app, recipe_id) == {'likes_count': 1, 'favorites_count': 1, 'comments_count': 1}
+    assert user_counts(app, alice_id)['likes_received'] == 1
+
+    assert bob.delete('/api/comments', json={'comment_id': comment['id']}).status_code == 204
+    assert bob.delete('/api/likes', json={'recipe_id': recipe_id}).status_code == 200
+    assert recipe_counts(app, recipe_id) == {'likes_count': 0, 'favorites_count': 0, 'comments_count': 0}
+    assert user_counts(app, alice_id)['likes_received'] == 0
+
+    # Served from the counters, not from counting rows.
+    assert bob.post('/api/favorites', json={'recipe_id': recipe_id}).status_code == 201
+    detail = bob.get(f'/api/recipes/{recipe_id}').json
+    assert (detail['likes_count'], detail['favorites_count'], detail['comments_count']) == (0, 1, 0)
+
+
+def test_deleting_a_recipe_takes_its_likes_off_the_owner(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    kept, deleted = create_recipe(alice, 'Kept'), create_recipe(alice, 'Deleted')
+    signup(bob, 'bob')
+    for recipe_id in (kept, deleted):
+        assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+
+    assert alice.delete(f'/api/recipes/{deleted}').status_code == 204
+    assert user_counts(app, alice_id) == {
+        'recipe_count': 1, 'likes_received': 1, 'follower_count': 0, 'following_count': 0, 'unread_notifications': 2
+    }
+
+
+def test_reconcile_rebuilds_drifted_counters(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id = signup(bob, 'bob')
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+    assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).status_code == 201
+    assert bob.post('/api/follows', json={'user_id': alice_id}).status_code == 201
+    expected_recipe, expected_alice, expected_bob = (
+        recipe_counts(app, recipe_id), user_counts(app, alice_id), user_counts(app, bob_id)
+    )
+
+    with app.app_context():
+        Recipe.query.update({name: 99 for name in RECIPE_COUNTERS})
+        User.query.update({name: 99 for name in USER_COUNTERS})
+        db.session.commit()
+        reconcile_counters()
+
+    assert recipe_counts(app, recipe_id) == expected_recipe == {'likes_count': 1, 'favorites_count': 1, 'comments_count': 1}
+    assert user_counts(app, alice_id) == expected_alice
+    assert user_counts(app, bob_id) == expected_bob == {
+        'recipe_count': 0, 'likes_received': 0, 'follower_count': 0, 'following_count': 1, 'unread_notifications': 0
+    }
@@ -0,0 +1,23 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('uri', ['sqlite://', 'sqlite:///:memory:'])
+def test_app_starts_on_an_in_memory_database(uri):
+    # config.py builds the engine at import, so each URI needs a fresh process.
+    env = dict(os.environ, DATABASE_URI=uri, DATABASE_REPLICA_URIS='')
+    script = (
+        'from app import app\n'
+        'from config import db\n'
+        'with app.app_context():\n'
+        '    db.create_all()\n'
+        '    print(db.session.execute(db.text("select count(*) from recipes")).scalar())\n'
+    )
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '0'
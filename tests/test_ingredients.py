@@ -0,0 +1,78 @@
+import pytest
+
+from conftest import signup, sync_replica
+from config import db
+from ingredients import backfill_ingredients, intersect, parse_ingredient, parse_ingredients, union
+from models import RecipeIngredient
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('400g spaghetti', (400.0, 'g', 'spaghetti')),
+    ('1 1/2 cups of brown sugar', (1.5, 'cup', 'brown sugar')),
+    ('4 large eggs', (4.0, None, 'egg')),
+    ('½ tsp salt', (0.5, 'tsp', 'salt')),
+    ('2-3 cloves garlic', (2.0, 'clove', 'garlic')),
+    ('a pinch of salt', (1.0, 'pinch', 'salt')),
+    ('Tomatoes (ripe)', (None, None, 'tomato')),
+    ('salt to taste', (None, None, 'salt')),
+])
+def test_parse_ingredient(text, expected):
+    assert tuple(parse_ingredient(text))[:3] == expected
+
+
+def test_parse_ingredients_splits_lines_and_skips_blanks():
+    assert [i.name for i in parse_ingredients('200g pasta, 1 lemon;\nsalt,, fresh')] == ['pasta', 'lemon', 'salt']
+
+
+def test_posting_list_operations():
+    assert intersect([1, 3, 5, 7, 9], [3, 4, 5, 9], [5, 9, 11]) == [5, 9]
+    assert intersect([1, 2], []) == []
+    assert union([1, 4], [2, 4, 6], []) == [1, 2, 4, 6]
+
+
+def post_recipe(client, title, ingredients):
+    response = client.post('/api/recipes', json={
+        'title': title, 'ingredients': ingredients, 'instructions': 'Cook it all together.', 'cooking_time': 10
+    })
+    assert response.status_code == 201, response.json
+    return response.json['id']
+
+
+def by_ingredients(client, ingredients, match='all'):
+    response = client.get(f'/api/recipes/by_ingredients?ingredients={ingredients}&match={match}')
+    assert response.status_code == 200, response.json
+    return [recipe['id'] for recipe in response.json['recipes']]
+
+
+def test_recipes_by_ingredients(app):
+    client = app.test_client()
+    signup(client, 'alice')
+    omelette = post_recipe(client, 'Omelette', '3 large eggs, a pinch of salt')
+    pasta = post_recipe(client, 'Lemon pasta', '200g pasta, 1 lemon, salt')
+    cake = post_recipe(client, 'Cake', '2 eggs, 1 cup flour, 100g sugar')
+    sync_replica()
+
+    assert by_ingredients(client, 'Eggs,salt') == [omelette]
+    assert by_ingredients(client, 'egg,lemon', 'any') == [cake, pasta, omelette]
+    assert by_ingredients(client, 'egg,salt,pasta,lemon', 'only') == [pasta, omelette]
+    assert client.get('/api/recipes/by_ingredients?ingredients=egg&match=some').status_code == 400
+
+    # Editing the ingredients re-parses them.
+    assert client.patch(f'/api/recipes/{pasta}', json={'ingredients': '200g pasta, 2 eggs'}).status_code == 200
+    sync_replica()
+    assert by_ingredients(client, 'egg') == [cake, pasta, omelette]
+    assert by_ingredients(client, 'lemon') == []
+
+
+def test_backfill_rebuilds_the_index(app):
+    client = app.test_client()
+    signup(client, 'alice')
+    recipe_ids = [post_recipe(client, f'Recipe {i}', '1 onion, 2 carrots') for i in range(5)]
+    with app.app_context():
+        RecipeIngredient.query.delete()
+        db.session.commit()
+        assert backfill_ingredients(batch_size=2) == 5
+        rows = db.session.query(RecipeIngredient.recipe_id, RecipeIngredient.name).order_by(
+            RecipeIngredient.recipe_id, RecipeIngredient.position
+        ).all()
+    assert rows == [(recipe_id, name) for recipe_id in recipe_ids for name in ('onion', 'carrot')]
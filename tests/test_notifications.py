@@ -0,0 +1,29 @@
+from conftest import create_recipe, signup
+
+
+def replayed_ids(response):
+    # The first keepalive comes once the catch-up replay is over.
+    events, buffer = [], ''
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        *done, buffer = buffer.split('\n\n')
+        events += done
+        if ': keepalive' in done:
+            break
+    response.close()
+    return [int(event.split('\n')[0][len('id: '):]) for event in events if event.startswith('id: ')]
+
+
+def test_stream_replays_everything_missed_in_pages(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'SSE_REPLAY_PAGE_SIZE', 2)
+    monkeypatch.setitem(app.config, 'SSE_KEEPALIVE_SECONDS', 0)
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    for i in range(5):
+        assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': f'Comment {i}'}).status_code == 201
+
+    response = alice.get('/api/notifications/stream', headers={'Last-Event-ID': '1'}, buffered=False)
+    assert response.status_code == 200
+    assert replayed_ids(response) == [2, 3, 4, 5]
@@ -0,0 +1,64 @@
+import re
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from conftest import create_recipe, signup
+from config import db
+
+# A full pass over one of these tables. An ordered walk of an index
+# ("SCAN recipes USING INDEX ...") is what a LIMITed feed page should do.
+FULL_SCAN = re.compile(r'^SCAN (recipes|likes|favorites|comments)$')
+
+
+@pytest.fixture
+def data(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+    assert bob.post('/api/comments', json={'recipe_id': recipe_id, 'content': 'Lovely'}).status_code == 201
+    # A like favorites the recipe too.
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+    assert bob.post('/api/follows', json={'user_id': 1}).status_code == 201
+    return alice, bob, recipe_id
+
+
+def selects_issued(requests):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(Engine, 'before_cursor_execute', capture)
+    try:
+        for client, url in requests:
+            assert client.get(url).status_code == 200, url
+    finally:
+        event.remove(Engine, 'before_cursor_execute', capture)
+    return statements
+
+
+def test_hot_endpoints_do_not_scan_tables(app, data):
+    alice, bob, recipe_id = data
+    statements = selects_issued([
+        (bob, '/api/recipes'),
+        (bob, '/api/recipes?limit=10&include=likes,favorites,comments'),
+        (bob, f'/api/recipes/{recipe_id}'),
+        (bob, '/api/recipes/user/1'),
+        (bob, f'/api/comments/recipe/{recipe_id}'),
+        (bob, '/api/favorites/user/2'),
+        (bob, '/api/recipes/trending'),
+        (bob, '/api/timeline'),
+        (bob, f'/api/me/interactions?recipe_ids={recipe_id}'),
+        (alice, '/api/notifications/user/1'),
+        (alice, '/api/notifications/user/1/unread_count'),
+    ])
+    assert statements
+
+    with app.app_context(), db.engine.connect() as connection:
+        for statement, parameters in statements:
+            plan = [row[3] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            assert not [step for step in plan if FULL_SCAN.match(step)], (statement, plan)
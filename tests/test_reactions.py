@@ -0,0 +1,85 @@
+from conftest import create_recipe, signup
+
+
+def test_repeated_likes_and_unlikes_are_no_ops(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+
+    first = bob.post('/api/likes', json={'recipe_id': recipe_id})
+    assert first.status_code == 201
+    assert first.json == {
+        'recipe_id': recipe_id, 'liked': True, 'favorited': True, 'likes_count': 1, 'favorites_count': 1
+    }
+    again = bob.post('/api/likes', json={'recipe_id': recipe_id})
+    assert (again.status_code, again.json) == (200, first.json)
+
+    removed = bob.delete('/api/likes', json={'recipe_id': recipe_id})
+    assert removed.status_code == 200
+    assert removed.json == {
+        'recipe_id': recipe_id, 'liked': False, 'favorited': False, 'likes_count': 0, 'favorites_count': 0
+    }
+    again = bob.delete('/api/likes', json={'recipe_id': recipe_id})
+    assert (again.status_code, again.json) == (200, removed.json)
+
+
+def test_repeated_favorites_and_unfavorites_are_no_ops(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    signup(bob, 'bob')
+
+    first = bob.post('/api/favorites', json={'recipe_id': recipe_id})
+    assert first.status_code == 201
+    assert first.json == {'recipe_id': recipe_id, 'favorited': True, 'likes_count': 0, 'favorites_count': 1}
+    again = bob.post('/api/favorites', json={'recipe_id': recipe_id})
+    assert (again.status_code, again.json) == (200, first.json)
+
+    # Unfavoriting also takes back the like that came with it.
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).json['likes_count'] == 1
+    removed = bob.delete('/api/favorites', json={'recipe_id': recipe_id})
+    assert removed.status_code == 200
+    assert removed.json == {
+        'recipe_id': recipe_id, 'liked': False, 'favorited': False, 'likes_count': 0, 'favorites_count': 0
+    }
+    again = bob.delete('/api/favorites', json={'recipe_id': recipe_id})
+    assert (again.status_code, again.json) == (200, removed.json)
+
+
+def test_reactions_to_missing_recipes(client):
+    signup(client, 'alice')
+    for method in (client.post, client.delete):
+        for url in ('/api/likes', '/api/favorites'):
+            response = method(url, json={'recipe_id': 999})
+            assert response.status_code == 404, (method, url)
+            assert response.json == {'error': 'Recipe not found'}
+
+
+def test_reactions_need_a_session_and_a_recipe_id(app):
+    assert app.test_client().post('/api/likes', json={'recipe_id': 1}).status_code == 401
+    client = app.test_client()
+    signup(client, 'alice')
+    assert client.post('/api/favorites', json={}).json == {'error': 'recipe_id is required'}
+
+
+def test_idempotency_key_replays_the_first_response(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    other_id = create_recipe(alice, 'Tomato soup')
+    signup(bob, 'bob')
+    headers = {'Idempotency-Key': 'like-once'}
+
+    first = bob.post('/api/likes', json={'recipe_id': recipe_id}, headers=headers)
+    assert first.status_code == 201
+    retry = bob.post('/api/likes', json={'recipe_id': recipe_id}, headers=headers)
+    assert (retry.status_code, retry.json) == (201, first.json)
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+
+    # The key is scoped to the user: Alice's request with it runs normally.
+    assert alice.post('/api/likes', json={'recipe_id': recipe_id}, headers=headers).json['likes_count'] == 2
+
+    reused = bob.post('/api/likes', json={'recipe_id': other_id}, headers=headers)
+    assert reused.status_code == 422
+    assert bob.post('/api/likes', json={'recipe_id': other_id}).status_code == 201
@@ -0,0 +1,18 @@
+from conftest import create_recipe, signup
+
+
+def test_recipe_detail_arrays_are_opt_in(app):
+    alice, bob = app.test_client(), app.test_client()
+    signup(alice, 'alice')
+    recipe_id = create_recipe(alice)
+    bob_id = signup(bob, 'bob')
+    assert bob.post('/api/likes', json={'recipe_id': recipe_id}).status_code == 201
+
+    detail = bob.get(f'/api/recipes/{recipe_id}')
+    assert 'likes' not in detail.json and 'favorites' not in detail.json
+    assert (detail.json['likes_count'], detail.json['favorites_count']) == (1, 1)
+
+    full = bob.get(f'/api/recipes/{recipe_id}?include=likes,favorites')
+    assert [like['user_id'] for like in full.json['likes']] == [bob_id]
+    assert [favorite['user_id'] for favorite in full.json['favorites']] == [bob_id]
+    assert full.headers['ETag'] != detail.headers['ETag']
@@ -0,0 +1,62 @@
+import os
+
+from conftest import REPLICA, create_recipe, signup, sync_replica
+from cache import cache, RECIPE_KEY
+from config import db
+from replicas import replicas
+
+
+def test_reads_go_to_the_replica_unless_the_client_just_wrote(app):
+    writer, reader = app.test_client(), app.test_client()
+    signup(writer, 'alice')
+    recipe_id = create_recipe(writer, 'Old title')
+    sync_replica()
+
+    assert writer.patch(f'/api/recipes/{recipe_id}', json={'title': 'New title'}).status_code == 200
+
+    # The replica has not caught up: other clients still see the old row,
+    # while the writer reads its own change from the primary. (A query
+    # string keeps the response cache out of the way.)
+    feed = '/api/recipes?limit=10'
+    assert reader.get(feed).json['recipes'][0]['title'] == 'Old title'
+    assert writer.get(feed).json['recipes'][0]['title'] == 'New title'
+
+    sync_replica()
+    assert reader.get(feed).json['recipes'][0]['title'] == 'New title'
+
+
+def test_cache_misses_are_filled_from_the_primary(app):
+    writer, reader = app.test_client(), app.test_client()
+    signup(writer, 'alice')
+    recipe_id = create_recipe(writer, 'Old title')
+    sync_replica()
+    assert reader.get(f'/api/recipes/{recipe_id}').json['title'] == 'Old title'
+    assert cache.get(RECIPE_KEY.format(id=recipe_id)) is not None
+
+    assert writer.patch(f'/api/recipes/{recipe_id}', json={'title': 'New title'}).status_code == 200
+    # The PATCH cleared the entry; refilling it skips the lagging replica.
+    assert reader.get(f'/api/recipes/{recipe_id}').json['title'] == 'New title'
+
+    response = writer.get(f'/api/recipes/{recipe_id}')
+    assert response.json['title'] == 'New title'
+    revalidated = writer.get(f'/api/recipes/{recipe_id}', headers={'If-None-Match': response.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_failed_replica_falls_back_to_the_primary(app):
+    client = app.test_client()
+    signup(client, 'alice')
+    recipe_id = create_recipe(client)
+
+    # A fresh replica file has no tables, so every read on it fails.
+    with app.app_context():
+        db.engines['replica-0'].dispose()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(REPLICA + suffix):
+            os.remove(REPLICA + suffix)
+
+    reader = app.test_client()
+    response = reader.get(f'/api/recipes/{recipe_id}')
+    assert response.status_code == 200
+    assert response.json['title'] == 'Lemon pasta'
+    assert replicas._down_until
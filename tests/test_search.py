@@ -0,0 +1,46 @@
+import threading
+from types import SimpleNamespace
+
+from search import MemoryIndex
+
+
+def recipe(id, title):
+    return SimpleNamespace(id=id, title=title, description='a quick weeknight dinner', ingredients='pasta, lemon')
+
+
+def test_memory_index_survives_concurrent_writes_and_reads():
+    index = MemoryIndex()
+    for id in range(200):
+        index.add(recipe(id, f'lemon pasta {id}'))
+
+    errors, stop = [], threading.Event()
+
+    def write(offset):
+        try:
+            for round in range(200):
+                for id in range(offset, 200, 4):
+                    index.remove(id)
+                    index.add(recipe(id, f'lemon pasta {id} v{round}'))
+        except Exception as e:
+            errors.append(e)
+
+    def read():
+        try:
+            while not stop.is_set():
+                index.rank(['lem', 'pasta'])
+        except Exception as e:
+            errors.append(e)
+
+    writers = [threading.Thread(target=write, args=(offset,)) for offset in range(4)]
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert len(index.rank(['lemon'])) == 200
+    assert index.vocabulary == sorted(index.postings)
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from throttle import login_throttle
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def login(client, forwarded_for):
+    return client.post(
+        '/api/login', json={'username': 'nobody', 'password': 'wrong-password'},
+        headers={'X-Forwarded-For': forwarded_for}
+    ).status_code
+
+
+def test_login_limit_is_per_client_behind_the_proxy(app, monkeypatch):
+    monkeypatch.setattr(login_throttle, 'ip_limit', 2)
+    client = app.test_client()
+
+    assert [login(client, '203.0.113.7') for _ in range(3)] == [401, 401, 429]
+    # Another client behind the same proxy has its own budget.
+    assert login(client, '198.51.100.4') == 401
+    # A forged entry in front of the proxy's own is ignored.
+    assert login(client, '198.51.100.4, 203.0.113.7') == 429
+
+
+def test_login_rejects_non_string_credentials(app):
+    client = app.test_client()
+    assert client.post('/api/login', json={'username': 123, 'password': 'password123'}).status_code == 400
+    assert client.post('/api/login', json={'username': 'alice', 'password': ['x']}).status_code == 400
+    assert client.post('/api/login', data='not json').status_code == 401
+
+
+def test_forwarded_for_is_ignored_unless_a_proxy_is_configured():
+    # config.py wraps the app at import, so this needs a fresh process.
+    env = dict(os.environ)
+    env.pop('TRUSTED_PROXY_HOPS')
+    script = 'from app import app; print(type(app.wsgi_app).__name__)'
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() != 'ProxyFix'
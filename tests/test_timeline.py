@@ -0,0 +1,98 @@
+from conftest import create_recipe, signup, sync_replica
+
+
+def follow(client, user_id):
+    return client.post('/api/follows', json={'user_id': user_id})
+
+
+def timeline(client):
+    sync_replica()
+    response = client.get('/api/timeline')
+    assert response.status_code == 200, response.json
+    return [recipe['id'] for recipe in response.json['recipes']]
+
+
+def test_following_fills_and_unfollowing_clears_the_timeline(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    older = create_recipe(alice, 'Old favourite')
+    bob_id = signup(bob, 'bob')
+    assert timeline(bob) == []
+
+    response = follow(bob, alice_id)
+    assert response.status_code == 201
+    assert response.json == {'user_id': alice_id, 'following': True, 'follower_count': 1}
+    # Recipes from before the follow are backfilled.
+    assert timeline(bob) == [older]
+
+    newer = create_recipe(alice, 'New dish')
+    assert timeline(bob) == [newer, older]
+
+    assert bob.delete('/api/follows', json={'user_id': alice_id}).json == {
+        'user_id': alice_id, 'following': False, 'follower_count': 0
+    }
+    assert timeline(bob) == []
+    assert bob.get(f'/api/users/{bob_id}').json['following_count'] == 0
+
+
+def test_follows_are_idempotent_and_counted(app):
+    alice, bob, carol = app.test_client(), app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    bob_id = signup(bob, 'bob')
+    signup(carol, 'carol')
+
+    assert follow(bob, alice_id).status_code == 201
+    again = follow(bob, alice_id)
+    assert (again.status_code, again.json['follower_count']) == (200, 1)
+    assert follow(carol, alice_id).json['follower_count'] == 2
+
+    sync_replica()
+    assert alice.get(f'/api/users/{alice_id}').json['follower_count'] == 2
+    assert bob.get(f'/api/users/{bob_id}').json['following_count'] == 1
+
+    assert bob.delete('/api/follows', json={'user_id': alice_id}).status_code == 200
+    repeat = bob.delete('/api/follows', json={'user_id': alice_id})
+    assert (repeat.status_code, repeat.json['follower_count']) == (200, 1)
+
+
+def test_deleted_recipes_leave_timelines(app):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    signup(bob, 'bob')
+    follow(bob, alice_id)
+    recipe_id = create_recipe(alice)
+    assert timeline(bob) == [recipe_id]
+
+    assert alice.delete(f'/api/recipes/{recipe_id}').status_code == 204
+    assert timeline(bob) == []
+
+
+def test_popular_authors_are_pulled_at_read_time(app, monkeypatch):
+    alice, bob = app.test_client(), app.test_client()
+    alice_id = signup(alice, 'alice')
+    signup(bob, 'bob')
+    monkeypatch.setitem(app.config, 'TIMELINE_FANOUT_LIMIT', 0)
+
+    follow(bob, alice_id)
+    first = create_recipe(alice, 'First')
+    second = create_recipe(alice, 'Second')
+    assert timeline(bob) == [second, first]
+
+    response = bob.get('/api/timeline?limit=1')
+    assert [recipe['id'] for recipe in response.json['recipes']] == [second]
+    cursor = response.json['next_cursor']
+    page = bob.get(f'/api/timeline?limit=1&cursor={cursor}').json
+    assert [recipe['id'] for recipe in page['recipes']] == [first]
+
+
+def test_follow_errors(app):
+    assert app.test_client().post('/api/follows', json={'user_id': 1}).status_code == 401
+    client = app.test_client()
+    user_id = signup(client, 'alice')
+
+    assert follow(client, user_id).json == {'error': 'You cannot follow yourself'}
+    assert client.post('/api/follows', json={}).json == {'error': 'user_id is required'}
+    assert follow(client, '2').json == {'error': 'user_id must be an integer'}
+    response = follow(client, 999)
+    assert (response.status_code, response.json) == (404, {'error': 'User not found'})
+    assert app.test_client().get('/api/timeline').status_code == 401
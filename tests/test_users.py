@@ -0,0 +1,65 @@
+from conftest import signup
+from usernames import BloomFilter, usernames
+
+
+def post_signup(client, username, email):
+    return client.post('/api/signup', json={'username': username, 'email': email, 'password': 'password123'})
+
+
+def test_signup_rejects_duplicates_regardless_of_case(app):
+    signup(app.test_client(), 'alice')
+
+    response = post_signup(app.test_client(), 'ALICE', 'other@example.com')
+    assert response.status_code == 400
+    assert response.json == {'error': 'Username already taken'}
+
+    response = post_signup(app.test_client(), 'alicia', 'Alice@Example.com')
+    assert response.status_code == 400
+    assert response.json == {'error': 'Email already registered'}
+
+
+def test_unique_index_catches_names_the_filter_has_not_seen(app, monkeypatch):
+    signup(app.test_client(), 'alice')
+    # Another worker registered the name after this one built its filter.
+    monkeypatch.setattr(usernames, '_filter', BloomFilter(100, 0.01))
+    monkeypatch.setattr(usernames, '_built_at', float('inf'))
+
+    response = post_signup(app.test_client(), 'Alice', 'other@example.com')
+    assert response.status_code == 400
+    assert response.json == {'error': 'Username already taken'}
+
+
+def test_check_username(client):
+    assert client.get('/api/check_username?username=al').status_code == 400
+    assert client.get('/api/check_username?username=alice').json == {'username': 'alice', 'available': True}
+
+    signup(client, 'alice')
+    assert client.get('/api/check_username?username=Alice').json == {'username': 'Alice', 'available': False}
+
+
+def test_profile_edit_rejects_taken_names(app):
+    signup(app.test_client(), 'alice')
+    bob = app.test_client()
+    bob_id = signup(bob, 'bob')
+
+    response = bob.patch(f'/api/users/{bob_id}', json={'username': 'Alice'})
+    assert response.status_code == 400
+    assert response.json == {'error': 'Username already taken'}
+
+    response = bob.patch(f'/api/users/{bob_id}', json={'email': 'ALICE@example.com'})
+    assert response.status_code == 400
+    assert response.json == {'error': 'Email already taken'}
+
+    response = bob.patch(f'/api/users/{bob_id}', json={'username': 'Bobby'})
+    assert response.status_code == 200
+    assert response.json['username'] == 'Bobby'
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.01)
+    names = [f'user{i}' for i in range(1000)]
+    for name in names:
+        bloom.add(name)
+    assert all(name in bloom for name in names)
+    false_positives = sum(f'other{i}' in bloom for i in range(1000))
+    assert false_positives < 50
@@ -0,0 +1,75 @@
+import glob
+import os
+import shutil
+import signal
+import subprocess
+import sys
+
+from conftest import create_recipe, signup
+from config import db
+from models import Like, Notification, Recipe
+from writebehind import recover
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Buffers likes with a flush interval far beyond the test, says so, and
+# waits to be killed with nothing committed.
+WORKER = '''
+import sys, time
+from app import app
+from writebehind import WriteBehindBuffer
+
+buffer = WriteBehindBuffer(dict(app.config, WRITE_BEHIND_JOURNAL_DIR=sys.argv[1], WRITE_BEHIND_INTERVAL_MS=3600000))
+recipe_id = int(sys.argv[2])
+for user_id in (2, 3, 4):
+    buffer.enqueue(user_id, recipe_id, True)
+buffer.enqueue(4, recipe_id, False)
+buffer.enqueue(2, recipe_id, False)
+buffer.enqueue(2, recipe_id, True)
+print('ready', flush=True)
+time.sleep(60)
+'''
+
+
+def likes(app, recipe_id):
+    with app.app_context():
+        db.session.remove()
+        recipe = db.session.get(Recipe, recipe_id)
+        users = sorted(like.user_id for like in Like.query.filter_by(recipe_id=recipe_id))
+        return recipe.likes_count, users, Notification.query.filter_by(recipe_id=recipe_id).count()
+
+
+def test_likes_journaled_by_a_killed_worker_are_recovered_once(app, tmp_path):
+    client = app.test_client()
+    signup(client, 'alice')
+    recipe_id = create_recipe(client)
+    for name in ('bob', 'carol', 'dave'):
+        signup(app.test_client(), name)
+
+    journal_dir = str(tmp_path / 'journal')
+    worker = subprocess.Popen(
+        [sys.executable, '-c', WORKER, journal_dir, str(recipe_id)],
+        cwd=ROOT, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert worker.stdout.readline().strip() == 'ready'
+    finally:
+        worker.send_signal(signal.SIGKILL)
+        worker.wait()
+        worker.stdout.close()
+    assert likes(app, recipe_id) == (0, [], 0)
+
+    journals = glob.glob(os.path.join(journal_dir, 'likes-*.jsonl*'))
+    assert journals
+    backup = str(tmp_path / 'backup')
+    shutil.copytree(journal_dir, backup)
+
+    assert recover(journal_dir) == 6
+    assert likes(app, recipe_id) == (2, [2, 3], 1)
+    assert not glob.glob(os.path.join(journal_dir, 'likes-*.jsonl*'))
+
+    # Replaying the same journal again changes nothing.
+    shutil.rmtree(journal_dir)
+    shutil.copytree(backup, journal_dir)
+    assert recover(journal_dir) == 6
+    assert likes(app, recipe_id) == (2, [2, 3], 1)
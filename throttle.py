@@ -0,0 +1,167 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import click
+
+from cache import cache, StoreCache
+from config import app
+
+
+class MemoryCounters:
+    """Fixed-window counters for a single worker."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, window):
+        now = time.monotonic()
+        with self._lock:
+            count, expires_at = self._windows.get(key, (0, 0))
+            if expires_at <= now:
+                count, expires_at = 0, now + window
+            self._windows[key] = (count + 1, expires_at)
+            if len(self._windows) > self.max_keys:
+                self._windows = {k: v for k, v in self._windows.items() if v[1] > now}
+            return count + 1
+
+    def get(self, key):
+        with self._lock:
+            count, expires_at = self._windows.get(key, (0, 0))
+            return count if expires_at > time.monotonic() else 0
+
+    def delete(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+
+class StoreCounters:
+    """Fixed-window counters in the shared cache store (``incr`` and
+    ``expire`` from the redis-py API), so limits hold across workers."""
+
+    def __init__(self, client, prefix):
+        self.client = client
+        self.prefix = prefix
+
+    def incr(self, key, window):
+        count = self.client.incr(self.prefix + key)
+        if count == 1:
+            self.client.expire(self.prefix + key, window)
+        return count
+
+    def get(self, key):
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class LoginThrottle:
+    """Caps login attempts per client IP, and failed logins per username.
+
+    Both checks run before any password hashing, so throttled requests cost
+    a counter lookup rather than a bcrypt round.
+    """
+
+    def __init__(self, counters, config):
+        self.counters = counters
+        self.ip_limit = config['LOGIN_IP_LIMIT']
+        self.ip_window = config['LOGIN_IP_WINDOW']
+        self.user_limit = config['LOGIN_USER_FAILURE_LIMIT']
+        self.user_window = config['LOGIN_USER_WINDOW']
+
+    def _user_key(self, username):
+        return f'login:user:{username.lower()}'
+
+    def retry_after(self, ip, username):
+        """Seconds the client should wait, or 0 when the attempt may proceed.
+        Counts the attempt against the IP."""
+        if self.counters.incr(f'login:ip:{ip}', self.ip_window) > self.ip_limit:
+            return self.ip_window
+        if username and self.counters.get(self._user_key(username)) >= self.user_limit:
+            return self.user_window
+        return 0
+
+    def failed(self, username):
+        if username:
+            self.counters.incr(self._user_key(username), self.user_window)
+
+    def succeeded(self, username):
+        self.counters.delete(self._user_key(username))
+
+
+def create_counters(cache):
+    if isinstance(cache, StoreCache):
+        return StoreCounters(cache.client, cache.prefix + 'throttle:')
+    return MemoryCounters()
+
+
+login_throttle = LoginThrottle(create_counters(cache), app.config)
+
+
+def _flood(url, username, stop, statuses, lock):
+    body = json.dumps({'username': username, 'password': 'wrong-password'}).encode()
+    while not stop.is_set():
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request) as response:
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except OSError:
+            status = 'error'
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+@app.cli.command('benchmark-login-flood')
+@click.option('--url', default='http://127.0.0.1:8000', help='Base URL of a running server.')
+@click.option('--threads', default=48, help='Threads posting wrong passwords to /api/login.')
+@click.option('--seconds', default=20, help='Duration of the flood.')
+@click.option('--username', default='bench', help='Username the flood logs in as.')
+def benchmark_login_flood_command(url, threads, seconds, username):
+    """Flood a running server's /api/login from one address while timing
+    GET /api/recipes, to see how much the login path slows everything else.
+
+    Run it against gunicorn with the worker settings used in production;
+    set LOGIN_IP_LIMIT very high on the server to measure the bcrypt pool
+    without the throttle.
+    """
+    url = url.rstrip('/')
+    stop, lock, statuses = threading.Event(), threading.Lock(), {}
+    flooders = [
+        threading.Thread(target=_flood, args=(f'{url}/api/login', username, stop, statuses, lock), daemon=True)
+        for _ in range(threads)
+    ]
+    for thread in flooders:
+        thread.start()
+
+    latencies = []
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(f'{url}/api/recipes') as response:
+                response.read()
+        except OSError:
+            continue
+        latencies.append(time.perf_counter() - started)
+    stop.set()
+    for thread in flooders:
+        thread.join()
+
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100)
+        print(f'recipes: {len(latencies)} requests, p50 {cuts[49] * 1000:.0f}ms, p99 {cuts[98] * 1000:.0f}ms')
+    else:
+        print(f'recipes: {len(latencies)} requests')
+    # 401s are logins that reached bcrypt; 429 were throttled and 503 were
+    # turned away by a full hashing pool.
+    print(f'logins: {statuses.get(401, 0) / seconds:.1f} checked/s, ' + ', '.join(
+        f'{status}: {count}' for status, count in sorted(statuses.items(), key=str)
+    ))
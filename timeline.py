@@ -0,0 +1,110 @@
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from config import app, db
+from counters import bump_user_counters
+from models import User, Recipe, Follow, TimelineEntry
+from pagination import keyset_page, encode_cursor
+
+# Home timelines are materialized: a new recipe is copied into every
+# follower's timeline when it is posted (fan-out on write), so reading one
+# is a range scan however many authors the user follows. Pushing a recipe
+# from an author with more than TIMELINE_FANOUT_LIMIT followers would write
+# that many rows in the request, so those authors are not pushed; their
+# recipes are pulled and merged in at read time instead (fan-out on read).
+# Recipes posted while over the limit are not pushed later if the author
+# drops back under it.
+
+TIMELINE_COLUMNS = ('user_id', 'recipe_id', 'author_id', 'created_at')
+
+
+def _follower_count(user_id):
+    return db.session.execute(select(User.follower_count).where(User.id == user_id)).scalar()
+
+
+def _pushed(follower_count):
+    return follower_count <= app.config['TIMELINE_FANOUT_LIMIT']
+
+
+def follow_user(follower_id, followed_id):
+    """Returns ``(changed, follower_count)``; the count is ``None`` when the
+    followed user does not exist. The caller commits."""
+    follower_count = _follower_count(followed_id)
+    if follower_count is None:
+        return False, None
+    try:
+        with db.session.begin_nested():
+            db.session.execute(insert(Follow).values(follower_id=follower_id, followed_id=followed_id))
+    except IntegrityError:
+        return False, follower_count
+    bump_user_counters(follower_id, following_count=1)
+    bump_user_counters(followed_id, follower_count=1)
+    follower_count += 1
+    if _pushed(follower_count):
+        _backfill(follower_id, followed_id)
+    return True, follower_count
+
+
+def unfollow_user(follower_id, followed_id):
+    """Returns ``(changed, follower_count)`` like ``follow_user``."""
+    follower_count = _follower_count(followed_id)
+    if follower_count is None:
+        return False, None
+    removed = db.session.execute(delete(Follow).where(
+        Follow.follower_id == follower_id, Follow.followed_id == followed_id
+    )).rowcount
+    if not removed:
+        return False, follower_count
+    bump_user_counters(follower_id, following_count=-1)
+    bump_user_counters(followed_id, follower_count=-1)
+    db.session.execute(delete(TimelineEntry).where(
+        TimelineEntry.user_id == follower_id, TimelineEntry.author_id == followed_id
+    ))
+    return True, follower_count - 1
+
+
+def _backfill(follower_id, followed_id):
+    # A new follower sees the author's latest recipes right away.
+    recent = select(db.literal(follower_id), Recipe.id, Recipe.user_id, Recipe.created_at).where(
+        Recipe.user_id == followed_id,
+        ~exists().where(TimelineEntry.user_id == follower_id, TimelineEntry.recipe_id == Recipe.id)
+    ).order_by(Recipe.created_at.desc(), Recipe.id.desc()).limit(app.config['TIMELINE_BACKFILL'])
+    db.session.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, recent))
+
+
+def fan_out(recipe):
+    """Push a new recipe into its author's followers' timelines with one
+    INSERT ... SELECT. Returns the number of timelines written."""
+    if not _pushed(_follower_count(recipe.user_id) or 0):
+        return 0
+    followers = select(Follow.follower_id, Recipe.id, Recipe.user_id, Recipe.created_at).join(
+        Recipe, Recipe.user_id == Follow.followed_id
+    ).where(Follow.followed_id == recipe.user_id, Recipe.id == recipe.id)
+    return db.session.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, followers)).rowcount
+
+
+def remove_from_timelines(recipe_id):
+    db.session.execute(delete(TimelineEntry).where(TimelineEntry.recipe_id == recipe_id))
+
+
+def home_timeline(user_id, cursor=None, limit=20):
+    """One newest-first page of recipe ids from the authors ``user_id``
+    follows, and the cursor for the next page."""
+    pushed = db.session.query(TimelineEntry.created_at, TimelineEntry.recipe_id).filter(TimelineEntry.user_id == user_id)
+    entries, more_pushed = keyset_page(pushed, TimelineEntry.created_at, TimelineEntry.recipe_id, cursor, limit)
+
+    pulled_authors = db.session.execute(select(Follow.followed_id).join(User, User.id == Follow.followed_id).where(
+        Follow.follower_id == user_id, User.follower_count > app.config['TIMELINE_FANOUT_LIMIT']
+    )).scalars().all()
+    pulled, more_pulled = [], None
+    if pulled_authors:
+        query = db.session.query(Recipe.created_at, Recipe.id).filter(Recipe.user_id.in_(pulled_authors))
+        pulled, more_pulled = keyset_page(query, Recipe.created_at, Recipe.id, cursor, limit)
+
+    # Each source gave its first ``limit`` rows after the cursor, so the
+    # first ``limit`` of their merge are the page. A recipe pushed before its
+    # author went over the limit comes from both.
+    merged = sorted({(created_at, id) for created_at, id in entries + pulled}, reverse=True)
+    page = merged[:limit]
+    more = more_pushed or more_pulled or len(merged) > limit
+    return [id for _, id in page], encode_cursor(*page[-1]) if more and page else None
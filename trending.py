@@ -0,0 +1,122 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, or_, select, update
+
+from config import app, db
+from models import Recipe, Like, Favorite, Comment, TrendingEpoch
+
+# A recipe's score is the sum of weight * 2 ** ((t - epoch) / half_life)
+# over its likes, favorites and comments made at time t. Ranking by that
+# is the same as ranking by engagement decayed to "now", but adding or
+# removing one event only touches one term, so write paths update scores
+# in place and never need the other events. `flask decay-trending` moves
+# the epoch forward (scaling every score down by the same factor) before
+# the terms grow too large for a float.
+
+PERIODS = {'day': Recipe.trending_score, 'week': Recipe.weekly_score}
+
+
+def _half_life_seconds(period):
+    return app.config['TRENDING_HALF_LIVES_HOURS'][period] * 60 * 60
+
+
+def engagement(kind, at=None, removed=False):
+    """A ``(weight, time)`` event for ``score_terms``; removing an event
+    must pass the time it was recorded at."""
+    weight = app.config['TRENDING_WEIGHTS'][kind]
+    return (-weight if removed else weight, at or datetime.utcnow())
+
+
+def current_epoch(for_update=False):
+    # Writers share-lock the epoch row and the decay job locks it
+    # exclusively, so no increment is scaled against a stale epoch.
+    row = db.session.query(TrendingEpoch).filter(TrendingEpoch.id == 1).with_for_update(
+        read=not for_update
+    ).first()
+    if row is None:
+        row = TrendingEpoch(id=1, epoch=datetime.utcnow())
+        db.session.add(row)
+        db.session.flush()
+    return row.epoch
+
+
+def _scores(events, epoch):
+    return {
+        column: sum(weight * 2 ** ((at - epoch).total_seconds() / _half_life_seconds(period)) for weight, at in events)
+        for period, column in PERIODS.items()
+    }
+
+
+def score_terms(events):
+    """UPDATE values adding ``events`` to both scores. Taking an event back
+    out leaves float residue rather than 0, so results below
+    TRENDING_MIN_SCORE are zeroed."""
+    return {
+        column: db.case((column + delta < app.config['TRENDING_MIN_SCORE'], 0), else_=column + delta)
+        for column, delta in _scores(events, current_epoch()).items()
+    }
+
+
+def record_engagement(recipe_id, events):
+    if events:
+        db.session.execute(update(Recipe).where(Recipe.id == recipe_id).values(
+            {**score_terms(events), Recipe.updated_at: Recipe.updated_at}
+        ))
+
+
+def trending_query(query, period):
+    column = PERIODS[period]
+    return query.filter(column > app.config['TRENDING_MIN_SCORE']).order_by(column.desc(), Recipe.id.desc())
+
+
+def decay_trending(now=None):
+    """Move the epoch to ``now`` and scale scores to match. Scores that fall
+    below TRENDING_MIN_SCORE are zeroed so they drop out of the ranking."""
+    now = now or datetime.utcnow()
+    epoch = current_epoch(for_update=True)
+    values = {'updated_at': Recipe.updated_at}
+    for period, column in PERIODS.items():
+        factor = 2 ** (-(now - epoch).total_seconds() / _half_life_seconds(period))
+        values[column.key] = db.case((column * factor < app.config['TRENDING_MIN_SCORE'], 0), else_=column * factor)
+    result = db.session.execute(update(Recipe).where(or_(*(column != 0 for column in PERIODS.values()))).values(values))
+    db.session.query(TrendingEpoch).filter(TrendingEpoch.id == 1).update({TrendingEpoch.epoch: now})
+    db.session.commit()
+    return result.rowcount
+
+
+def rebuild_trending():
+    """Recompute every score from the likes, favorites and comments tables."""
+    epoch = current_epoch(for_update=True)
+    events = defaultdict(list)
+    for model, kind in ((Like, 'like'), (Favorite, 'favorite'), (Comment, 'comment')):
+        for recipe_id, created_at in db.session.execute(select(model.recipe_id, model.created_at)).yield_per(1000):
+            events[recipe_id].append(engagement(kind, created_at))
+
+    db.session.execute(update(Recipe).values(trending_score=0, weekly_score=0, updated_at=Recipe.updated_at))
+    rows = [
+        dict({column.key: score for column, score in _scores(recipe_events, epoch).items()}, recipe_id=recipe_id)
+        for recipe_id, recipe_events in events.items()
+    ]
+    if rows:
+        db.session.connection().execute(
+            update(Recipe.__table__).where(Recipe.__table__.c.id == bindparam('recipe_id')).values(
+                trending_score=bindparam('trending_score'), weekly_score=bindparam('weekly_score'),
+                updated_at=Recipe.__table__.c.updated_at
+            ),
+            rows
+        )
+    db.session.commit()
+    return len(rows)
+
+
+@app.cli.command('decay-trending')
+def decay_trending_command():
+    """Rescale trending scores to the current time (run from cron, e.g. hourly)."""
+    print(f"Rescaled {decay_trending()} trending scores.")
+
+
+@app.cli.command('rebuild-trending')
+def rebuild_trending_command():
+    """Recompute trending scores from scratch."""
+    print(f"Scored {rebuild_trending()} recipes.")
@@ -0,0 +1,94 @@
+import hashlib
+import math
+import threading
+import time
+
+from sqlalchemy import func
+
+from config import app, db
+from models import User
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter: ``in`` may report false positives but never
+    false negatives."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, value):
+        # Two 64-bit halves of one digest stand in for k hash functions
+        # (Kirsch-Mitzenmacher double hashing).
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class UsernameRegistry:
+    """Answers "is this username taken?" from a Bloom filter of every
+    lower-cased username, going to the database only when the filter says
+    the name may exist.
+
+    The filter lives in one worker and only learns names that worker
+    registers, so it is rebuilt every ``refresh`` seconds. A stale "free"
+    answer is harmless: the unique index still rejects the insert.
+    """
+
+    def __init__(self, capacity, error_rate, refresh):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh = refresh
+        self._filter = None
+        self._built_at = 0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        if self._filter is None or time.monotonic() - self._built_at > self.refresh:
+            with self._lock:
+                if self._filter is None or time.monotonic() - self._built_at > self.refresh:
+                    names = [name for name, in db.session.query(func.lower(User.username))]
+                    bloom = BloomFilter(max(self.capacity, len(names) * 2), self.error_rate)
+                    for name in names:
+                        bloom.add(name)
+                    self._filter, self._built_at = bloom, time.monotonic()
+        return self._filter
+
+    def taken(self, username):
+        username = username.lower()
+        if username not in self._current():
+            return False
+        return db.session.query(User.id).filter(func.lower(User.username) == username).first() is not None
+
+    def add(self, username):
+        if self._filter is not None:
+            self._filter.add(username.lower())
+
+
+class DatabaseUsernames:
+    """The same interface without the filter: one indexed lookup per check."""
+
+    def taken(self, username):
+        return db.session.query(User.id).filter(func.lower(User.username) == username.lower()).first() is not None
+
+    def add(self, username):
+        pass
+
+
+def create_usernames(config):
+    if config['USERNAME_BLOOM_FILTER']:
+        return UsernameRegistry(
+            config['USERNAME_BLOOM_CAPACITY'], config['USERNAME_BLOOM_ERROR_RATE'], config['USERNAME_BLOOM_REFRESH']
+        )
+    return DatabaseUsernames()
+
+
+usernames = create_usernames(app.config)
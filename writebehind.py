@@ -0,0 +1,204 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+
+from cache import invalidate_recipe
+from config import app, db
+from notifications import notify, publish_notification
+from reactions import apply_likes
+
+logger = logging.getLogger('grab_a_grub.writebehind')
+
+
+class Journal:
+    """Append-only log of buffered changes, one JSON line each.
+
+    Every worker writes its own file and holds an exclusive ``flock`` on it
+    while alive. The OS drops the lock when the process dies, which is how
+    recovery tells an orphaned journal from one still in use.
+    """
+
+    def __init__(self, directory, fsync):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'likes-{os.getpid()}.jsonl')
+        self.file = self._open(self.path)
+
+    def _open(self, path):
+        file = open(path, 'a', encoding='utf-8')
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return file
+
+    def append(self, change):
+        self.file.write(json.dumps(change) + '\n')
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+
+    def rotate(self):
+        """Start a fresh file. Returns the previous one, renamed but still
+        open and locked; remove it once its changes are committed."""
+        sealed = f'{self.path}.{os.urandom(4).hex()}.flushing'
+        os.rename(self.path, sealed)
+        previous, self.file = self.file, self._open(self.path)
+        return sealed, previous
+
+
+def read_changes(path):
+    """Changes recorded in a journal file, in order. A torn last line from a
+    crash mid-write is skipped."""
+    changes = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                change = json.loads(line)
+            except ValueError:
+                continue
+            changes.append(change)
+    return changes
+
+
+def coalesce(changes):
+    # Only the last change per (user, recipe) matters: like then unlike is
+    # the same as a single unlike.
+    return {(change['user_id'], change['recipe_id']): change['liked'] for change in changes}
+
+
+def commit_likes(changes):
+    """Apply coalesced changes in one transaction, adding one aggregated
+    notification per liked recipe, then publish and invalidate."""
+    changed = apply_likes(changes)
+    notifications = []
+    for recipe_id, (owner_id, likers) in changed.items():
+        others = [user_id for user_id in likers if user_id != owner_id]
+        if others:
+            notifications.append(notify(
+                type='like', user_id=owner_id, actor_id=others[-1], recipe_id=recipe_id,
+                others_count=len(others) - 1
+            ))
+    db.session.commit()
+
+    for notification in notifications:
+        publish_notification(notification)
+    for recipe_id, (owner_id, likers) in changed.items():
+        invalidate_recipe(recipe_id, owner_id)
+    return changed
+
+
+class WriteBehindBuffer:
+    """Acknowledges likes and unlikes immediately and writes them in batches.
+
+    Changes are journaled, coalesced per (user, recipe) in memory and
+    committed by a background thread every ``interval`` seconds, or as soon
+    as ``max_batch`` are pending. Applying a batch is idempotent (see
+    ``reactions.apply_likes``), so replaying a journal whose batch was
+    already committed changes nothing; that is what makes recovery safe.
+    """
+
+    def __init__(self, config):
+        self.interval = config['WRITE_BEHIND_INTERVAL_MS'] / 1000
+        self.max_batch = config['WRITE_BEHIND_MAX_BATCH']
+        self.journal_dir = config['WRITE_BEHIND_JOURNAL_DIR']
+        self.fsync = config['WRITE_BEHIND_FSYNC']
+        self.journal = None
+        self.pending = {}
+        self.sealed = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _start(self):
+        # Started lazily, in the worker process itself: threads and file
+        # locks do not survive a pre-fork server's fork.
+        if self.journal_dir:
+            recover(self.journal_dir)
+            self.journal = Journal(self.journal_dir, self.fsync)
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+        atexit.register(self.flush)
+
+    def enqueue(self, user_id, recipe_id, liked):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+            change = {'user_id': user_id, 'recipe_id': recipe_id, 'liked': liked}
+            if self.journal:
+                self.journal.append(change)
+            self.pending[(user_id, recipe_id)] = liked
+            if len(self.pending) >= self.max_batch:
+                self._wake.set()
+
+    def flush(self):
+        """Commit everything enqueued so far. Returns the number of changes."""
+        with self._flush_lock:
+            with self._lock:
+                if not self.pending:
+                    return 0
+                batch, self.pending = self.pending, {}
+                if self.journal:
+                    self.sealed.append(self.journal.rotate())
+            with app.app_context():
+                try:
+                    commit_likes(batch)
+                except Exception:
+                    db.session.rollback()
+                    logger.exception('Could not write %d buffered likes, will retry', len(batch))
+                    with self._lock:
+                        # Changes enqueued meanwhile are newer and win.
+                        for key, liked in batch.items():
+                            self.pending.setdefault(key, liked)
+                    return 0
+            for path, file in self.sealed:
+                os.remove(path)
+                file.close()
+            self.sealed = []
+            return len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+
+def recover(directory):
+    """Replay journals left by workers that died before flushing. Returns
+    the number of changes replayed."""
+    replayed = 0
+    for path in sorted(glob.glob(os.path.join(directory, 'likes-*.jsonl*')), key=os.path.getmtime):
+        with open(path, 'a') as file:
+            try:
+                fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # a live worker's journal
+            changes = read_changes(path)
+            if changes:
+                with app.app_context():
+                    try:
+                        commit_likes(coalesce(changes))
+                    except Exception:
+                        db.session.rollback()
+                        logger.exception('Could not replay %s', path)
+                        continue
+                replayed += len(changes)
+            os.remove(path)
+    if replayed:
+        logger.warning('Replayed %d buffered likes from %s', replayed, directory)
+    return replayed
+
+
+write_behind = WriteBehindBuffer(app.config) if app.config['WRITE_BEHIND'] else None
+
+
+@app.cli.command('replay-write-behind')
+def replay_write_behind_command():
+    """Write likes left in write-behind journals by stopped workers."""
+    print(f"Replayed {recover(app.config['WRITE_BEHIND_JOURNAL_DIR'])} buffered likes.")